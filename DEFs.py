@@ -9,6 +9,21 @@ from google.oauth2.service_account import Credentials
 from google.oauth2 import service_account
 from docx import Document
 import io
+import os
+import json
+import time
+import threading
+import queue
+import random
+from collections import deque, OrderedDict
+from itertools import zip_longest
+from concurrent.futures import Future
+import numpy as np
+import weakref
+import re
+import unicodedata
+import httplib2
+import google_auth_httplib2
 
 
 # ---------------------------------------------------
@@ -19,6 +34,26 @@ RANGE = "Respostas ao formulário 1"  # aba da planilha
 
 CAMINHO_EXCEL = "dados/controle_laudos.xlsx"
 
+# snapshot local das respostas (valores brutos) + marca d'água da sincronização
+CAMINHO_SNAPSHOT = "dados/snapshot_respostas.parquet"
+CAMINHO_SNAPSHOT_META = "dados/snapshot_respostas.json"
+
+# releitura completa periódica, para capturar edições feitas em linhas antigas
+INTERVALO_SYNC_COMPLETO = 6 * 60 * 60  # segundos
+
+# colunas de texto longo: ficam fora do snapshot e são lidas sob demanda,
+# apenas quando um BO específico é aberto (Gerar Laudo / Importação SAEP)
+COLUNAS_LONGAS = ["Histórico", "Historico", "Quesitos"]
+
+# índice de busca textual (Histórico, Quesitos, Endereço do Fato), mantido
+# ao lado do snapshot: postings em Parquet + metadados em JSON
+CAMINHO_INDICE_TEXTOS = "dados/indice_textos.parquet"
+CAMINHO_INDICE_TEXTOS_META = "dados/indice_textos.json"
+COLUNAS_BUSCA_TEXTO = ["Histórico", "Historico", "Quesitos", "Endereço do Fato"]
+
+# tempo de vida do cache compartilhado dos dados da planilha (segundos)
+TTL_DADOS = int(st.secrets.get("ttl_dados", 300))
+
 # Carregar credenciais da Service Account
 # credentials = service_account.Credentials.from_service_account_file(
 #     "service_account.json",
@@ -30,63 +65,773 @@ credentials = service_account.Credentials.from_service_account_info(
     scopes=["https://www.googleapis.com/auth/spreadsheets"]
 )
 
+# tempo limite (segundos) de cada requisição HTTP à API do Sheets
+TIMEOUT_HTTP = 30
+
+# cota da API do Sheets por minuto (padrão do Google: 60 por usuário/minuto)
+COTA_LEITURAS_MINUTO = int(st.secrets.get("cota_leituras_minuto", 60))
+COTA_ESCRITAS_MINUTO = int(st.secrets.get("cota_escritas_minuto", 60))
+TENTATIVAS_SHEETS = 5
+INTERVALO_ESCRITAS = 1.0  # s; gravações que chegam nesta janela vão juntas
+STATUS_RETENTAVEIS = {429, 500, 502, 503, 504}
+
 # ------------------------------------DEFs--------------------------------
 
 # ---------------------------------------------------
-# FUNÇÃO PARA BUSCAR DADOS DO GOOGLE SHEETS NO RESUMO
+# CLIENTES DA API DO GOOGLE (UM POR PROCESSO)
+# ---------------------------------------------------
+
+# conexões HTTP reaproveitadas entre requisições (keep-alive). httplib2.Http
+# não é thread-safe, então cada requisição pega uma conexão livre do pool.
+_pool_http = queue.LifoQueue()
+
+
+def _nova_conexao_http():
+    # AuthorizedHttp renova o token de acesso automaticamente quando expira
+    return google_auth_httplib2.AuthorizedHttp(
+        credentials, http=httplib2.Http(timeout=TIMEOUT_HTTP)
+    )
+
+
+@st.cache_resource
+def obter_servico_sheets():
+    """
+    Cliente da API do Sheets construído uma vez por processo. Usa o
+    documento de discovery empacotado na biblioteca (sem download).
+    """
+    return build(
+        "sheets", "v4",
+        http=_nova_conexao_http(),
+        static_discovery=True,
+        cache_discovery=False
+    )
+
+
+def executar_pedido(pedido, tipo="leitura"):
+    """Executa um pedido da API, via agendador, usando uma conexão do pool."""
+    def executar():
+        try:
+            http = _pool_http.get_nowait()
+        except queue.Empty:
+            http = _nova_conexao_http()
+
+        try:
+            return pedido.execute(http=http)
+        finally:
+            _pool_http.put(http)
+
+    return chamar_sheets(executar, tipo)
+
+
+@st.cache_resource
+def obter_aba_planilha():
+    """Worksheet gspread da aba de respostas, aberta uma vez por processo."""
+    import gspread
+    gc = gspread.authorize(credentials)
+    return gc.open_by_key(SHEET_ID).worksheet(RANGE)
+
+
+# ---------------------------------------------------
+# AGENDADOR DE CHAMADAS AO SHEETS (COTA, RETRY E BACKOFF)
+# ---------------------------------------------------
+
+_contadores_sheets = {
+    "leituras": 0,
+    "escritas": 0,
+    "limitadas": 0,  # esperaram a janela de cota liberar
+    "retentativas": 0,  # receberam 429/5xx e foram repetidas
+    "falhas": 0,
+    "agrupadas": 0,  # gravações que foram no batch_update de outra
+}
+_janelas_cota = {"leitura": deque(), "escrita": deque()}
+_lock_cota = threading.Lock()
+
+
+def _aguardar_cota(tipo):
+    """Janela deslizante de 60 s: bloqueia até haver cota para o tipo."""
+    limite = COTA_LEITURAS_MINUTO if tipo == "leitura" else COTA_ESCRITAS_MINUTO
+    janela = _janelas_cota[tipo]
+
+    while True:
+        with _lock_cota:
+            agora = time.monotonic()
+            while janela and agora - janela[0] >= 60:
+                janela.popleft()
+
+            if len(janela) < limite:
+                janela.append(agora)
+                return
+
+            espera = 60 - (agora - janela[0])
+            _contadores_sheets["limitadas"] += 1
+
+        time.sleep(espera)
+
+
+def _status_http(erro):
+    """Status HTTP de um erro do googleapiclient ou do gspread (ou None)."""
+    resp = getattr(erro, "resp", None)  # googleapiclient.errors.HttpError
+    if resp is not None:
+        return getattr(resp, "status", None)
+
+    resp = getattr(erro, "response", None)  # gspread.exceptions.APIError
+    if resp is not None:
+        return getattr(resp, "status_code", None)
+
+    return None
+
+
+def chamar_sheets(funcao, tipo="leitura"):
+    """
+    Executa funcao() respeitando a cota por minuto do tipo ("leitura" ou
+    "escrita"). Em 429/5xx ou falha de rede, repete com backoff
+    exponencial com jitter (até TENTATIVAS_SHEETS tentativas).
+    """
+    for tentativa in range(TENTATIVAS_SHEETS):
+        _aguardar_cota(tipo)
+
+        try:
+            resultado = funcao()
+        except Exception as erro:
+            retentavel = (
+                _status_http(erro) in STATUS_RETENTAVEIS
+                or isinstance(erro, (TimeoutError, ConnectionError))
+            )
+            if not retentavel or tentativa == TENTATIVAS_SHEETS - 1:
+                with _lock_cota:
+                    _contadores_sheets["falhas"] += 1
+                raise
+
+            with _lock_cota:
+                _contadores_sheets["retentativas"] += 1
+            time.sleep(min(2 ** tentativa, 32) + random.uniform(0, 1))
+            continue
+
+        with _lock_cota:
+            _contadores_sheets["leituras" if tipo == "leitura" else "escritas"] += 1
+        return resultado
+
+
+def estatisticas_sheets():
+    """Cópia dos contadores do agendador (chamadas, limitadas, retentativas)."""
+    with _lock_cota:
+        return dict(_contadores_sheets)
+
+
 # ---------------------------------------------------
+# SINCRONIZAÇÃO INCREMENTAL COM SNAPSHOT LOCAL
+# ---------------------------------------------------
+
+
+def _letra_coluna(indice):
+    """Índice 0-based -> letra da coluna (0 -> A, 26 -> AA)."""
+    letras = ""
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def _intervalo_cabecalho():
+    return f"'{RANGE}'!A1:ZZZ1"
+
+
+def _indices_projetados(header):
+    """Posições das colunas sincronizadas no snapshot (exclui textos longos)."""
+    return [i for i, col in enumerate(header) if col not in COLUNAS_LONGAS]
+
+
+def _blocos_contiguos(indices):
+    """[0, 1, 2, 5, 6] -> [(0, 2), (5, 6)]"""
+    blocos = []
+    for i in indices:
+        if blocos and i == blocos[-1][1] + 1:
+            blocos[-1] = (blocos[-1][0], i)
+        else:
+            blocos.append((i, i))
+    return blocos
+
+
+def _intervalos_blocos(blocos, linha_inicial):
+    return [
+        f"'{RANGE}'!{_letra_coluna(ini)}{linha_inicial}:{_letra_coluna(fim)}"
+        for ini, fim in blocos
+    ]
 
 
-def carregar_dados_resumo():
-    service = build("sheets", "v4", credentials=credentials)
-    result = (
+def _faixas_para_frame(faixas, blocos):
+    """
+    Junta as faixas de um batchGet (uma por bloco de colunas) em um DataFrame
+    de strings com colunas posicionais ("0", "1", ...). A API omite linhas e
+    células vazias no final, então cada faixa é completada com "".
+    """
+    total = max((len(f.get("values", [])) for f in faixas), default=0)
+    colunas = {}
+
+    for faixa, (ini, fim) in zip(faixas, blocos):
+        largura = fim - ini + 1
+        linhas = faixa.get("values", [])
+
+        # transpõe linha -> coluna em C, completando células faltantes com ""
+        transposta = list(zip_longest(*linhas, fillvalue=""))[:largura]
+        vazia = ("",) * len(linhas)
+        transposta += [vazia] * (largura - len(transposta))
+
+        for j, valores in enumerate(transposta):
+            coluna = np.empty(total, dtype=object)
+            coluna[:len(valores)] = valores
+            coluna[len(valores):] = ""
+            colunas[str(ini + j)] = coluna
+
+    return pd.DataFrame(colunas, index=pd.RangeIndex(total))
+
+
+def _buscar_blocos(service, blocos, linha_inicial, com_cabecalho=False):
+    ranges = _intervalos_blocos(blocos, linha_inicial)
+    if com_cabecalho:
+        ranges = [_intervalo_cabecalho()] + ranges
+
+    result = executar_pedido(
         service.spreadsheets()
         .values()
-        .get(spreadsheetId=SHEET_ID, range=RANGE)
-        .execute()
+        .batchGet(spreadsheetId=SHEET_ID, ranges=ranges)
     )
-    values = result.get("values", [])
-    if not values:
+    return result.get("valueRanges", [])
+
+
+def _ler_snapshot():
+    if not (os.path.exists(CAMINHO_SNAPSHOT)
+            and os.path.exists(CAMINHO_SNAPSHOT_META)):
+        return None, None
+
+    try:
+        with open(CAMINHO_SNAPSHOT_META, encoding="utf-8") as f:
+            meta = json.load(f)
+        dados = pd.read_parquet(CAMINHO_SNAPSHOT)
+    except (OSError, ValueError):
+        # snapshot corrompido: força uma nova leitura completa
+        return None, None
+
+    if len(dados) != meta.get("linhas") or "indices" not in meta:
+        return None, None
+
+    return meta, dados
+
+
+def _gravar_snapshot(meta, dados):
+    os.makedirs(os.path.dirname(CAMINHO_SNAPSHOT), exist_ok=True)
+
+    # grava em arquivos temporários e troca de uma vez (evita snapshot parcial)
+    dados.to_parquet(CAMINHO_SNAPSHOT + ".tmp", index=False)
+    with open(CAMINHO_SNAPSHOT_META + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    os.replace(CAMINHO_SNAPSHOT + ".tmp", CAMINHO_SNAPSHOT)
+    os.replace(CAMINHO_SNAPSHOT_META + ".tmp", CAMINHO_SNAPSHOT_META)
+
+
+def _sincronizar_completo(service):
+    result = executar_pedido(
+        service.spreadsheets()
+        .values()
+        .get(spreadsheetId=SHEET_ID, range=_intervalo_cabecalho())
+    )
+    header = (result.get("values") or [[]])[0]
+    if not header:
+        return [], pd.DataFrame()
+
+    # cabeçalho pode ter mudado: descarta mapas de colunas das gravações
+    _cabecalhos_abas.clear()
+
+    indices = _indices_projetados(header)
+    blocos = _blocos_contiguos(indices)
+    dados = _faixas_para_frame(_buscar_blocos(service, blocos, 2), blocos)
+
+    agora = time.time()
+    meta = {
+        "header": header,
+        "indices": indices,
+        "linhas": len(dados),
+        "carimbo_final": dados["0"].iloc[-1] if len(dados) else None,
+        "sincronizado_em": agora,
+        "sincronizado_completo_em": agora,
+    }
+    _gravar_snapshot(meta, dados)
+    return header, dados
+
+
+def sincronizar_planilha(completo=False):
+    """
+    Mantém um snapshot local (Parquet) da aba de respostas e busca no
+    Google Sheets apenas as linhas adicionadas desde a última sincronização.
+
+    Só as colunas projetadas são baixadas (via batchGet, um intervalo por
+    bloco contíguo de colunas); os textos longos de COLUNAS_LONGAS ficam de
+    fora e são lidos sob demanda por carregar_campos_longos().
+
+    A marca d'água é o número de linhas já sincronizadas + o "Carimbo de
+    data/hora" da última delas. Se o cabeçalho mudar, se a última linha
+    conhecida não bater (linhas apagadas/reordenadas) ou se a última leitura
+    completa for mais antiga que INTERVALO_SYNC_COMPLETO, relê tudo.
+
+    Retorna (header, dados) — header é o cabeçalho completo da planilha e
+    dados um DataFrame de strings com colunas posicionais ("0", "1", ...)
+    apenas para as colunas projetadas, na ordem da planilha.
+    """
+    service = obter_servico_sheets()
+
+    meta, dados = (None, None) if completo else _ler_snapshot()
+    if meta is None or (
+        time.time() - meta.get("sincronizado_completo_em", 0)
+        > INTERVALO_SYNC_COMPLETO
+    ):
+        return _sincronizar_completo(service)
+
+    header = meta["header"]
+    blocos = _blocos_contiguos(meta["indices"])
+    n = meta["linhas"]
+
+    # linha 1 = cabeçalho; linha n + 1 = última linha já sincronizada
+    linha_inicial = n + 1 if n else 2
+    faixas = _buscar_blocos(service, blocos, linha_inicial, com_cabecalho=True)
+
+    header_atual = (faixas[0].get("values") or [[]])[0]
+    if header_atual != header:
+        return _sincronizar_completo(service)
+
+    delta = _faixas_para_frame(faixas[1:], blocos)
+
+    if n:
+        carimbo = delta["0"].iloc[0] if len(delta) else None
+        if carimbo != meta["carimbo_final"]:
+            return _sincronizar_completo(service)
+        delta = delta.iloc[1:]
+
+    if len(delta):
+        dados = pd.concat([dados, delta], ignore_index=True)
+        meta["linhas"] = len(dados)
+        meta["carimbo_final"] = dados["0"].iloc[-1]
+
+    meta["sincronizado_em"] = time.time()
+    _gravar_snapshot(meta, dados)
+    return header, dados
+
+
+# ---------------------------------------------------
+# CARREGAMENTO SOB DEMANDA DOS TEXTOS LONGOS
+# ---------------------------------------------------
+
+# {(versao, linha_sheet, colunas): {"Coluna": valor}}, do menos para o mais
+# recente (LRU). A linha só identifica o BO dentro de uma versão dos dados:
+# o cache é limpo sempre que _atualizar_dados troca o estado (linhas
+# removidas/inseridas deslocam as posições) e por invalidar_dados().
+LIMITE_CAMPOS_LONGOS = 256
+_campos_longos = OrderedDict()
+_lock_campos_longos = threading.Lock()
+
+
+def _limpar_campos_longos():
+    with _lock_campos_longos:
+        _campos_longos.clear()
+
+
+def carregar_campos_longos(linha_sheet, colunas=None):
+    """
+    Busca as colunas de texto longo (Histórico, Quesitos...) de UMA linha da
+    planilha (1-based). Usado quando um único BO é aberto.
+    """
+    colunas = tuple(colunas or COLUNAS_LONGAS)
+    header, _, versao = obter_dados_planilha()
+
+    chave = (versao, linha_sheet, colunas)
+    with _lock_campos_longos:
+        if chave in _campos_longos:
+            _campos_longos.move_to_end(chave)
+            return _campos_longos[chave]
+
+    indices = [i for i, col in enumerate(header) if col in colunas]
+    if not indices:
+        return {}
+
+    ranges = [f"'{RANGE}'!{_letra_coluna(i)}{linha_sheet}" for i in indices]
+    result = executar_pedido(
+        obter_servico_sheets().spreadsheets()
+        .values()
+        .batchGet(spreadsheetId=SHEET_ID, ranges=ranges)
+    )
+
+    campos = {}
+    for i, faixa in zip(indices, result.get("valueRanges", [])):
+        valores = faixa.get("values") or [[""]]
+        campos[header[i]] = valores[0][0] if valores[0] else ""
+
+    with _lock_campos_longos:
+        _campos_longos[chave] = campos
+        while len(_campos_longos) > LIMITE_CAMPOS_LONGOS:
+            _campos_longos.popitem(last=False)
+    return campos
+
+
+# ---------------------------------------------------
+# CACHE COMPARTILHADO DOS DADOS (TODAS AS PÁGINAS / SESSÕES)
+# ---------------------------------------------------
+
+# estado = (header, dados, versao, carregado_em, sincronizado_em); trocado de
+# uma vez só, então leitores sem lock nunca veem uma combinação parcial.
+# carregado_em é monotônico (TTL); sincronizado_em é a hora real (exibição).
+# geracao é incrementada por invalidar_dados(); a sincronização compara o
+# valor do início com o do fim para saber se foi invalidada no meio
+_estado_dados = {
+    "estado": None, "resincronizar": False, "erro": None, "geracao": 0
+}
+_frames_dados = {}
+_lock_dados = threading.Lock()  # uma sincronização por vez (single-flight)
+_lock_estado = threading.Lock()  # flags acima (rápido; não espera a sincronização)
+_lock_frames = threading.Lock()
+
+
+def _versao(header, dados):
+    return int(
+        pd.util.hash_pandas_object(dados, index=False).sum()
+    ) ^ hash(tuple(header))
+
+
+def _atualizar_dados():
+    """
+    Sincroniza e troca o estado atomicamente. Chamar com _lock_dados.
+
+    Retorna True se invalidar_dados() foi chamado durante a sincronização:
+    o que foi lido pode ser anterior à gravação, então o estado novo já é
+    instalado expirado e quem chamou deve sincronizar de novo.
+    """
+    with _lock_estado:
+        completo = _estado_dados["resincronizar"]
+        _estado_dados["resincronizar"] = False
+        geracao = _estado_dados["geracao"]
+
+    try:
+        header, dados = sincronizar_planilha(completo=completo)
+    except Exception as erro:
+        with _lock_estado:
+            _estado_dados["resincronizar"] |= completo
+            _estado_dados["erro"] = erro
+        raise
+
+    versao = _versao(header, dados)
+    with _lock_estado:
+        sujo = _estado_dados["geracao"] != geracao
+        _estado_dados["estado"] = (
+            header, dados, versao,
+            float("-inf") if sujo else time.monotonic(), time.time()
+        )
+        _estado_dados["erro"] = None
+
+    # textos longos em cache podem ser de outra linha (linhas removidas) ou
+    # ter sido editados direto na planilha: relidos sob demanda
+    _limpar_campos_longos()
+    return sujo
+
+
+def _atualizar_em_segundo_plano():
+    """Dispara uma sincronização fora da sessão, se nenhuma estiver rodando."""
+    if not _lock_dados.acquire(blocking=False):
+        return
+
+    def tarefa():
+        sujo = False
+        try:
+            sujo = _atualizar_dados()
+        except Exception:
+            pass  # mantém o snapshot anterior; erro fica em _estado_dados
+        finally:
+            _lock_dados.release()
+        if sujo:
+            _atualizar_em_segundo_plano()
+
+    threading.Thread(
+        target=tarefa, name="atualiza-planilha", daemon=True
+    ).start()
+
+
+def _carregar_estado_inicial():
+    """
+    Primeiro acesso do processo: usa o snapshot em disco, se houver, e
+    sincroniza em segundo plano. Sem snapshot, sincroniza e espera.
+    """
+    with _lock_dados:
+        if _estado_dados["estado"] is not None:
+            return
+
+        meta, dados = _ler_snapshot()
+        if meta is None:
+            _atualizar_dados()
+            return
+
+        header = meta["header"]
+        _estado_dados["estado"] = (
+            header, dados, _versao(header, dados),
+            float("-inf"), meta["sincronizado_em"]
+        )
+
+    _atualizar_em_segundo_plano()
+
+
+def obter_dados_planilha(ttl=None):
+    """
+    Retorna (header, dados, versao) do cache do processo, compartilhado por
+    todas as páginas e sessões (stale-while-revalidate): se o cache passou
+    do TTL, devolve na hora o snapshot atual e dispara uma única
+    sincronização em segundo plano, que troca os dados quando terminar.
+
+    versao é uma impressão digital do conteúdo: só muda quando os dados
+    realmente mudam, e pode ser usada como chave de caches derivados.
+    """
+    ttl = TTL_DADOS if ttl is None else ttl
+
+    if _estado_dados["estado"] is None:
+        _carregar_estado_inicial()
+
+    estado = _estado_dados["estado"]
+    if time.monotonic() - estado[3] > ttl:
+        _atualizar_em_segundo_plano()
+
+    return estado[0], estado[1], estado[2]
+
+
+def idade_dados():
+    """Segundos desde a última sincronização concluída (None se nunca)."""
+    estado = _estado_dados["estado"]
+    return None if estado is None else time.time() - estado[4]
+
+
+def atualizar_dados_agora():
+    """Sincroniza imediatamente (botão "Atualizar agora"), esperando o fim."""
+    with _lock_dados:
+        sujo = _atualizar_dados()
+    if sujo:
+        _atualizar_em_segundo_plano()
+
+
+def invalidar_dados(resincronizar=False):
+    """
+    Expira o cache compartilhado e agenda uma sincronização em segundo
+    plano. Use resincronizar=True após gravar na planilha: a sincronização
+    incremental só enxerga linhas novas, então edições em linhas existentes
+    exigem uma releitura completa.
+    """
+    with _lock_estado:
+        _estado_dados["geracao"] += 1
+        if resincronizar:
+            _estado_dados["resincronizar"] = True
+
+        estado = _estado_dados["estado"]
+        if estado is not None:
+            _estado_dados["estado"] = estado[:3] + (float("-inf"),) + estado[4:]
+    _limpar_campos_longos()
+
+    if estado is not None:
+        _atualizar_em_segundo_plano()
+
+
+@st.cache_resource
+def iniciar_atualizacao_periodica(intervalo=None):
+    """Thread (uma por processo) que mantém os dados aquecidos."""
+    intervalo = TTL_DADOS if intervalo is None else intervalo
+
+    def laco():
+        while True:
+            time.sleep(intervalo)
+            try:
+                with _lock_dados:
+                    sujo = _atualizar_dados()
+                if sujo:
+                    _atualizar_em_segundo_plano()
+            except Exception:
+                pass  # tenta de novo no próximo ciclo
+
+    thread = threading.Thread(
+        target=laco, name="atualiza-planilha-periodica", daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def exibir_status_dados():
+    """Idade dos dados e botão de atualização manual, na barra lateral."""
+    iniciar_atualizacao_periodica()
+
+    idade = idade_dados()
+    if idade is not None:
+        if idade < 60:
+            texto = "menos de 1 min"
+        elif idade < 3600:
+            texto = f"{int(idade // 60)} min"
+        else:
+            texto = f"{idade / 3600:.1f} h"
+        st.sidebar.caption(f"🕒 Dados sincronizados há {texto}")
+
+    if _estado_dados["erro"] is not None:
+        st.sidebar.caption(
+            "⚠️ A última sincronização falhou; exibindo o último snapshot."
+        )
+
+    if st.sidebar.button("🔄 Atualizar dados agora"):
+        atualizar_dados_agora()
+        st.rerun()
+
+    with st.sidebar.expander("📶 Chamadas ao Google Sheets"):
+        contadores = estatisticas_sheets()
+        st.caption(
+            f"Leituras: {contadores['leituras']} · "
+            f"Escritas: {contadores['escritas']} "
+            f"(+{contadores['agrupadas']} agrupadas)  \n"
+            f"Aguardaram cota: {contadores['limitadas']} · "
+            f"Repetidas (429/5xx): {contadores['retentativas']} · "
+            f"Falhas: {contadores['falhas']}"
+        )
+
+
+def _frame_memoizado(nome, versao, construir):
+    """Constrói (uma vez por versão dos dados) um DataFrame derivado."""
+    chave = (nome, versao)
+    df = _frames_dados.get(chave)
+    if df is None:
+        with _lock_frames:
+            df = _frames_dados.get(chave)
+            if df is None:
+                df = construir()
+                for antiga in [c for c in _frames_dados if c[0] == nome]:
+                    del _frames_dados[antiga]
+                _frames_dados[chave] = df
+    return df
+
+
+# ---------------------------------------------------
+# FUNÇÃO PARA BUSCAR DADOS DO GOOGLE SHEETS NO RESUMO
+# ---------------------------------------------------
+
+
+def carregar_dados_resumo(colunas=None, planilha=None):
+    """
+    DataFrame do Resumo/Estatísticas, lido do cache compartilhado.
+    colunas: se informado, monta apenas essas colunas (+ as derivadas).
+    planilha: (header, dados, versao) já obtido com obter_dados_planilha(),
+    para que a página use a mesma versao do df em caches derivados.
+    O objeto retornado é compartilhado entre sessões: não altere in-place.
+    """
+    header, dados, versao = planilha or obter_dados_planilha()
+    if not header:
         return pd.DataFrame(), None
 
-    header = values[0]
-    data = values[1:]
+    nome = "resumo" if colunas is None else ("resumo",) + tuple(colunas)
+    return _frame_memoizado(
+        nome, versao, lambda: _montar_dados_resumo(header, dados, colunas)
+    )
 
-    num_cols = len(header)
 
-    # 🔧 Normaliza todas as linhas
-    data_normalizada = [
-        linha + [""] * (num_cols - len(linha))
-        for linha in data
+def _projetar(dados, nomes, colunas):
+    """Seleciona as colunas posicionais do snapshot e aplica os nomes."""
+    posicoes = [
+        c for c in dados.columns
+        if colunas is None or nomes[int(c)] in colunas
     ]
+    df = dados[posicoes].copy()
+    df.columns = [nomes[int(c)] for c in posicoes]
+    return df
 
-    # 🔹 Normaliza nomes duplicados de colunas (SEM nova def)
-    contador = {}
-    header_normalizado = []
 
-    for col in header:
-        col = col.strip() if col else "Coluna"
+def _normalizar_cabecalho(header):
+    """Nomes vazios viram "Coluna"; repetidos ganham sufixo _2, _3..."""
+    nomes = pd.Series([col.strip() if col else "Coluna" for col in header])
+    ocorrencia = nomes.groupby(nomes).cumcount() + 1
+    return nomes.where(
+        ocorrencia == 1, nomes + "_" + ocorrencia.astype(str)
+    ).tolist()
 
-        if col in contador:
-            contador[col] += 1
-            header_normalizado.append(f"{col}_{contador[col]}")
-        else:
-            contador[col] = 1
-            header_normalizado.append(col)
 
-    # cria DF com cabeçalho
-    df = pd.DataFrame(data_normalizada, columns=header_normalizado)
+def converter_datas(serie, formato="%d/%m/%Y"):
+    """
+    Converte strings de data usando um formato conhecido (caminho rápido).
+    Só as células que não batem com o formato passam pela inferência lenta
+    (dayfirst). Cada valor distinto é convertido uma única vez.
+    """
+    codigos, unicos = pd.factorize(serie)
+    unicos = pd.Series(unicos, dtype=object)
 
-    df["Data da requisição"] = pd.to_datetime(
-        df["Data da requisição"],
-        errors="coerce",
-        dayfirst=True
+    datas = pd.to_datetime(unicos, format=formato, errors="coerce")
+    falhou = datas.isna() & unicos.str.strip().astype(bool)
+    if falhou.any():
+        datas[falhou] = pd.to_datetime(
+            unicos[falhou], format="mixed", dayfirst=True, errors="coerce"
+        )
+
+    valores = datas.to_numpy(dtype="datetime64[ns]")
+    resultado = np.where(
+        codigos >= 0, valores[codigos], np.datetime64("NaT")
+    ).astype("datetime64[ns]")
+    return pd.Series(resultado, index=serie.index, name=serie.name)
+
+
+def formatar_datas(serie, formato="%d/%m/%Y"):
+    """dt.strftime aplicado uma vez por data distinta (NaT -> NaN)."""
+    codigos, unicos = pd.factorize(serie)
+    textos = np.append(
+        pd.DatetimeIndex(unicos).strftime(formato).to_numpy(dtype=object),
+        np.nan
     )
+    return pd.Series(textos[codigos], index=serie.index, name=serie.name)
+
+
+# ---------------------------------------------------
+# ESQUEMA COMPACTO DO DATAFRAME (CATEGÓRICAS + STRINGS ARROW)
+# ---------------------------------------------------
+
+# colunas de baixa cardinalidade: guardadas como códigos inteiros
+COLUNAS_CATEGORICAS = [
+    "Perito",
+    "Natureza do fato",
+    "D.P. requisitante",
+    "D.P. do fato",
+    "Autoridade requisitante",
+    "Local preservado",
+]
+
+
+def aplicar_esquema(df):
+    """
+    Converte as COLUNAS_CATEGORICAS para category e o restante do texto
+    livre para strings Arrow (string[pyarrow]). Datas e números não mudam.
+    """
+    for col in df.columns:
+        if col in COLUNAS_CATEGORICAS:
+            df[col] = df[col].astype("category")
+        elif df[col].dtype == object:
+            df[col] = df[col].astype("string[pyarrow]")
+    return df
+
+
+def relatorio_memoria(df):
+    """Memória ocupada por coluna (deep), da maior para a menor."""
+    uso = df.memory_usage(deep=True, index=False)
+    return pd.DataFrame({
+        "Tipo": df.dtypes.astype(str),
+        "Memória (KB)": (uso / 1024).round(1),
+    }).sort_values("Memória (KB)", ascending=False)
+
+
+def _montar_dados_resumo(header, dados, colunas=None):
+    # 🔹 Normaliza nomes duplicados de colunas
+    header_normalizado = _normalizar_cabecalho(header)
+
+    # cria DF com cabeçalho
+    df = _projetar(dados, header_normalizado, colunas)
+
+    df["Data da requisição"] = converter_datas(df["Data da requisição"])
     df = df.sort_values(by="Data da requisição", ascending=True)
 
     # 🔹 Coluna PADRONIZADA PARA EXIBIÇÃO
-    df["Data da requisição_fmt"] = df["Data da requisição"].dt.strftime(
-        "%d/%m/%Y")
+    df["Data da requisição_fmt"] = formatar_datas(df["Data da requisição"])
 
     # ---------------------------
     # 🔑 CHAVE ÚNICA (BO + ANO)
@@ -99,7 +844,7 @@ def carregar_dados_resumo():
         + df["Ano requisicao"].astype(str)
     )
 
-    return df
+    return aplicar_esquema(df)
 
 # ---------------------------------------------------
 # FUNÇÃO PARA BUSCAR DADOS DO GOOGLE SHEETS NO GERAR LAUDO
@@ -107,36 +852,704 @@ def carregar_dados_resumo():
 
 
 def carregar_dados_geral():
-    service = build("sheets", "v4", credentials=credentials)
-    result = (service.spreadsheets()
-              .values()
-              .get(spreadsheetId=SHEET_ID, range=RANGE)
-              .execute()
-              )
-    values = result.get("values", [])
-    if not values:
+    header, dados, versao = obter_dados_planilha()
+    if not header:
         return pd.DataFrame(), None
 
-    # cria DF com cabeçalho
-    df = pd.DataFrame(values[1:], columns=values[0])
-
-    df["Data da requisição"] = pd.to_datetime(
-        df["Data da requisição"],
-        errors="coerce",
-        dayfirst=True
+    df = _frame_memoizado(
+        "geral", versao, lambda: _montar_dados_geral(header, dados)
     )
 
     # usamos gspread para update em células específicas
-    import gspread
-    gc = gspread.service_account(filename="service_account.json")
-    sheet = gc.open_by_key(SHEET_ID).worksheet(RANGE)
+    sheet = obter_aba_planilha()
 
     return df, sheet
 
+
+def _montar_dados_geral(header, dados):
+    # cria DF com cabeçalho (sem os textos longos: ver carregar_campos_longos)
+    df = _projetar(dados, header, None)
+
+    df["Data da requisição"] = converter_datas(df["Data da requisição"])
+    return df
+
+
+# ---------------------------------------------------
+# FILTROS POR PERÍODO / PERITO / BO (ÍNDICES ORDENADOS)
+# ---------------------------------------------------
+
+# índices auxiliares por DataFrame, montados uma vez e descartados junto
+# com o frame: {(id(df), "datas", coluna): (datas ordenadas, ordem|None),
+#               (id(df), "posicoes", coluna): {valor: posições},
+#               (id(df), "chaves", coluna): ver _indice_chaves,
+#               (id(df), "busca", colunas): ver _indice_busca}
+_indices_frames = {}
+
+
+def _indice_do_frame(df, tipo, coluna, construir):
+    chave = (id(df), tipo, coluna)
+    indice = _indices_frames.get(chave)
+    if indice is None:
+        indice = construir()
+        _indices_frames[chave] = indice
+        weakref.finalize(df, _indices_frames.pop, chave, None)
+    return indice
+
+
+def _indice_datas(df, coluna):
+    """
+    (datas ordenadas, ordem). Se o frame já está ordenado pela coluna (NaT
+    no fim, como deixa o sort_values), ordem é None e o filtro vira uma
+    fatia direta; senão guarda o argsort para não reordenar a cada filtro.
+    """
+    def construir():
+        datas = df[coluna]
+        validas = int(datas.notna().sum())
+        if (datas.iloc[:validas].is_monotonic_increasing
+                and datas.iloc[validas:].isna().all()):
+            return datas.to_numpy(), None
+
+        ordem = np.argsort(datas.to_numpy(), kind="stable")
+        return datas.to_numpy()[ordem], ordem
+
+    return _indice_do_frame(df, "datas", coluna, construir)
+
+
+def _indice_posicoes(df, coluna):
+    """{valor (texto): posições} da coluna, para filtros do tipo isin."""
+    def construir():
+        return df.groupby(
+            df[coluna].astype(str).to_numpy(), sort=False
+        ).indices
+
+    return _indice_do_frame(df, "posicoes", coluna, construir)
+
+
+def filtrar_dados(df, inicio=None, fim=None, filtros=None,
+                  coluna_data="Data da requisição"):
+    """
+    Filtra df pelo período [inicio, fim] (datas inclusivas) e por valores
+    de colunas (filtros = {"Perito": [...], "R.D.O.": [...]}; listas vazias
+    são ignoradas), sem copiar o frame.
+
+    O período é resolvido por busca binária sobre a coluna de datas
+    ordenada (O(log n)); os demais filtros usam as posições de cada valor,
+    pré-calculadas uma vez por frame. Sem filtros de valor, o resultado é uma
+    fatia (view) do frame original.
+    """
+    datas, ordem = _indice_datas(df, coluna_data)
+    i = 0 if inicio is None else datas.searchsorted(
+        pd.Timestamp(inicio).to_datetime64(), side="left")
+    j = len(datas) if fim is None else datas.searchsorted(
+        pd.Timestamp(fim).to_datetime64(), side="right")
+
+    # filtros de valor viram uma máscara por posição (sem ordenar/intersectar)
+    mascara = None
+    for coluna, valores in (filtros or {}).items():
+        if not valores:
+            continue
+        indice = _indice_posicoes(df, coluna)
+        selecao = np.zeros(len(df), dtype=bool)
+        for valor in valores:
+            selecao[indice.get(str(valor), [])] = True
+        mascara = selecao if mascara is None else mascara & selecao
+
+    if ordem is None:
+        if mascara is None:
+            return df.iloc[i:j]
+        return df.iloc[i + np.flatnonzero(mascara[i:j])]
+
+    no_periodo = np.sort(ordem[i:j])
+    if mascara is not None:
+        no_periodo = no_periodo[mascara[no_periodo]]
+    return df.iloc[no_periodo]
+
+
+# ---------------------------------------------------
+# ÍNDICE BO / CHAVE_CONTROLE -> LINHA DO FRAME E DA PLANILHA
+# ---------------------------------------------------
+
+
+def _indice_chaves(df, coluna):
+    """
+    ({chave: (posição no df, linha na planilha)}, {chave: [linhas]}) da
+    coluna (BO ou CHAVE_CONTROLE), montado uma vez por frame/versão.
+
+    A linha da planilha vem do índice original do snapshot (linha = índice
+    + 2, pois a linha 1 é o cabeçalho), então continua válida depois de
+    ordenar ou filtrar o frame. Chaves repetidas ficam com a primeira
+    ocorrência e são listadas no segundo dicionário.
+    """
+    def construir():
+        chaves = df[coluna].astype(str).str.strip().to_numpy(dtype=object)
+        linhas = df.index.to_numpy() + 2
+        posicoes = np.arange(len(df))
+
+        # dict() mantém o último valor de cada chave: invertendo a ordem,
+        # fica a primeira ocorrência
+        mapa = dict(zip(
+            chaves[::-1], zip(posicoes[::-1].tolist(), linhas[::-1].tolist())
+        ))
+
+        repetidas = pd.Series(chaves).duplicated(keep=False).to_numpy()
+        duplicadas = (
+            pd.Series(linhas[repetidas]).groupby(chaves[repetidas])
+            .agg(sorted).to_dict()
+        )
+        return mapa, duplicadas
+
+    return _indice_do_frame(df, "chaves", coluna, construir)
+
+
+def localizar_chave(df, chave, coluna="CHAVE_CONTROLE"):
+    """(posição no df, linha na planilha) da chave, ou None — O(1)."""
+    mapa, _ = _indice_chaves(df, coluna)
+    return mapa.get(str(chave).strip())
+
+
+def chaves_duplicadas(df, coluna="CHAVE_CONTROLE"):
+    """{chave: [linhas da planilha]} das chaves que aparecem mais de uma vez."""
+    _, duplicadas = _indice_chaves(df, coluna)
+    return duplicadas
+
+
+# ---------------------------------------------------
+# BUSCA DE BO POR DIGITAÇÃO (ÍNDICE DE PREFIXOS)
+# ---------------------------------------------------
+
+# máximo de BOs enviados como opções de um selectbox/multiselect
+LIMITE_SUGESTOES = 50
+
+
+def normalizar_texto(serie):
+    """Minúsculas e sem acentos ("São Paulo" -> "sao paulo")."""
+    return (
+        serie.astype(object).fillna("").astype(str).str.lower()
+        .str.normalize("NFKD")
+        .str.encode("ascii", "ignore")
+        .str.decode("ascii")
+    )
+
+
+def _tokens(serie):
+    """Quebra o texto normalizado em palavras e números ("BO12/24" -> bo, 12, 24)."""
+    return normalizar_texto(serie).str.findall(r"[a-z]+|\d+")
+
+
+def _indice_busca(df, colunas):
+    """
+    Índice de prefixos sobre os tokens das colunas: vocabulário ordenado e,
+    para cada token, as posições (linhas do df) onde ele aparece. Como o
+    vocabulário é ordenado, todos os tokens com um mesmo prefixo formam um
+    intervalo contíguo — a busca é só um par de searchsorted + fatia.
+    """
+    def construir():
+        tokens, posicoes = [], []
+        for col in colunas:
+            if col not in df.columns:
+                continue
+            explodido = _tokens(
+                pd.Series(df[col].to_numpy(), index=np.arange(len(df)))
+            ).explode().dropna()
+            tokens.append(explodido.to_numpy(dtype=object))
+            posicoes.append(explodido.index.to_numpy())
+
+        if not tokens:
+            return np.array([], dtype=object), np.zeros(1, int), np.array([], int)
+
+        codigos, vocabulario = pd.factorize(
+            np.concatenate(tokens), sort=True
+        )
+        ordem = np.argsort(codigos, kind="stable")
+        inicios = np.searchsorted(
+            codigos[ordem], np.arange(len(vocabulario) + 1)
+        )
+        return vocabulario, inicios, np.concatenate(posicoes)[ordem]
+
+    return _indice_do_frame(df, "busca", tuple(colunas), construir)
+
+
+def buscar_chaves(df, consulta, coluna, colunas_busca=(), dentro_de=None,
+                  limite=LIMITE_SUGESTOES):
+    """
+    Até `limite` valores de `coluna` (ex.: BO) cujas linhas contêm todos os
+    termos da consulta como prefixo de alguma palavra em `coluna` ou em
+    `colunas_busca` (protocolo, endereço...). Os registros mais recentes
+    vêm primeiro. Com consulta vazia, devolve os mais recentes.
+
+    dentro_de restringe o resultado às linhas de um recorte do df (ex.: o
+    frame filtrado), sem montar outro índice.
+    """
+    termos = _tokens(pd.Series([consulta or ""])).iloc[0]
+
+    # mais recentes primeiro (o frame está em ordem de chegada/data); pega
+    # uma folga de linhas porque o mesmo BO pode se repetir
+    if not termos:
+        base = df if dentro_de is None else dentro_de
+        valores = base[coluna].iloc[::-1].head(limite * 4)
+        return list(dict.fromkeys(valores.astype(str)))[:limite]
+
+    vocabulario, inicios, postings = _indice_busca(
+        df, (coluna,) + tuple(colunas_busca)
+    )
+    # cada termo marca as linhas com alguma palavra começando por ele; a
+    # linha precisa ter todos os termos
+    mascara = np.ones(len(df), dtype=bool)
+    for termo in termos:
+        a = vocabulario.searchsorted(termo, side="left")
+        b = vocabulario.searchsorted(termo + "\uffff", side="left")
+        achadas = np.zeros(len(df), dtype=bool)
+        achadas[postings[inicios[a]:inicios[b]]] = True
+        mascara &= achadas
+    posicoes = np.flatnonzero(mascara)
+
+    if dentro_de is not None:
+        posicoes = posicoes[df.index[posicoes].isin(dentro_de.index)]
+
+    # o BO digitado por inteiro vem antes dos demais (índice de chaves, O(1))
+    exato = (
+        localizar_chave(df, consulta, coluna)
+        or localizar_chave(df, consulta.upper(), coluna)
+    )
+    if exato is not None and mascara[exato[0]] and (
+        dentro_de is None or df.index[exato[0]] in dentro_de.index
+    ):
+        posicoes = np.append(posicoes, exato[0])
+
+    valores = df[coluna].iloc[posicoes[::-1][:limite * 4]]
+    return list(dict.fromkeys(valores.astype(str)))[:limite]
+
+
+# ---------------------------------------------------
+# BUSCA NOS TEXTOS LONGOS (ÍNDICE INVERTIDO + BM25)
+# ---------------------------------------------------
+
+# palavras sem valor de busca (já sem acento, como saem de normalizar_texto)
+STOPWORDS = set("""
+a o as os e de da do das dos em no na nos nas num numa um uma uns umas
+para pra por pelo pela pelos pelas com sem que se ao aos ou mas como ja
+nao foi ser sua seu suas seus ele ela eles elas este esta esse essa isso
+isto aquele aquela lhe mais muito sobre entre ate quando onde tambem so ha
+""".split())
+
+# plural -> singular (primeira regra que casar), só em palavras de letras
+REGRAS_PLURAL = [
+    (re.compile(padrao), troca) for padrao, troca in [
+        (r"oes$", "ao"),
+        (r"aes$", "ao"),
+        (r"ais$", "al"),
+        (r"eis$", "el"),
+        (r"ois$", "ol"),
+        (r"ns$", "m"),
+        (r"(?<=[a-z]{3})s$", ""),
+    ]
+]
+
+# parâmetros do BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# documentos tokenizados por vez (limita a memória do explode)
+LOTE_INDEXACAO = 2000
+
+# estado do índice em memória (trocado de uma vez, como _estado_dados):
+# postings ordenados por termo + vocabulário/inícios para busca binária
+_indice_textos = {"estado": None}
+_lock_indice_textos = threading.Lock()
+
+
+def _radical(palavra):
+    """Reduz o plural ("cofres" -> "cofre", "portoes" -> "portao")."""
+    if len(palavra) < 4 or not palavra.isalpha():
+        return palavra
+    for padrao, troca in REGRAS_PLURAL:
+        radical, trocas = padrao.subn(troca, palavra)
+        if trocas:
+            return radical
+    return palavra
+
+
+def _termos_consulta(consulta):
+    """Mesma tokenização de _termos_textos, para uma única string."""
+    texto = unicodedata.normalize("NFKD", consulta.lower())
+    texto = texto.encode("ascii", "ignore").decode("ascii")
+    return list(dict.fromkeys(
+        _radical(p) for p in re.findall(r"[a-z0-9]+", texto)
+        if len(p) > 1 and p not in STOPWORDS
+    ))
+
+
+def _termos_textos(textos):
+    """
+    Tokeniza uma Series de textos (índice = linha na planilha) em
+    (linha, termo, frequência) + tamanho de cada documento.
+    Sem acento, minúsculo, sem stopwords e com plurais reduzidos.
+    """
+    palavras = normalizar_texto(textos).str.findall(r"[a-z0-9]+").explode()
+    palavras = palavras[
+        palavras.notna() & ~palavras.isin(STOPWORDS)
+        & (palavras.str.len() > 1)
+    ]
+    tamanhos = palavras.groupby(level=0).size()
+
+    codigos, unicos = pd.factorize(palavras.to_numpy(dtype=object))
+    radicais = np.array([_radical(p) for p in unicos], dtype=object)[codigos]
+    frequencias = (
+        pd.DataFrame({"linha": palavras.index.to_numpy(), "termo": radicais})
+        .groupby(["termo", "linha"], sort=False).size()
+        .reset_index(name="tf")
+    )
+    return frequencias, tamanhos
+
+
+def _montar_estado_indice(postings, meta):
+    postings = postings.sort_values("termo", kind="stable", ignore_index=True)
+    codigos, vocabulario = pd.factorize(postings["termo"], sort=True)
+    inicios = np.searchsorted(codigos, np.arange(len(vocabulario) + 1))
+
+    # tamanho de cada documento por linha da planilha (0 = sem texto)
+    tamanhos = meta.get("tamanhos", {})
+    linhas_doc = np.fromiter((int(linha) for linha in tamanhos), dtype=int)
+    comprimento = np.zeros(
+        max(len(meta.get("carimbos", [])) + 2, linhas_doc.max(initial=0) + 1)
+    )
+    comprimento[linhas_doc] = np.fromiter(tamanhos.values(), dtype=float)
+
+    return {
+        "postings": postings,
+        "vocabulario": np.asarray(vocabulario, dtype=object),
+        "inicios": inicios,
+        "linhas": postings["linha"].to_numpy(),
+        "tf": postings["tf"].to_numpy(dtype=float),
+        "comprimento": comprimento,
+        "meta": meta,
+    }
+
+
+def _ler_indice_textos():
+    if not (os.path.exists(CAMINHO_INDICE_TEXTOS)
+            and os.path.exists(CAMINHO_INDICE_TEXTOS_META)):
+        return None
+
+    try:
+        with open(CAMINHO_INDICE_TEXTOS_META, encoding="utf-8") as f:
+            meta = json.load(f)
+        postings = pd.read_parquet(CAMINHO_INDICE_TEXTOS)
+    except (OSError, ValueError):
+        return None  # índice corrompido: reconstrói
+
+    return _montar_estado_indice(postings, meta)
+
+
+def _gravar_indice_textos(estado):
+    os.makedirs(os.path.dirname(CAMINHO_INDICE_TEXTOS), exist_ok=True)
+
+    estado["postings"].to_parquet(CAMINHO_INDICE_TEXTOS + ".tmp", index=False)
+    with open(CAMINHO_INDICE_TEXTOS_META + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(estado["meta"], f, ensure_ascii=False)
+
+    os.replace(CAMINHO_INDICE_TEXTOS + ".tmp", CAMINHO_INDICE_TEXTOS)
+    os.replace(CAMINHO_INDICE_TEXTOS_META + ".tmp", CAMINHO_INDICE_TEXTOS_META)
+
+
+def _buscar_textos_planilha(header, linha_inicial):
+    """Textos das COLUNAS_BUSCA_TEXTO da linha_inicial até o fim, juntos por linha."""
+    indices = [i for i, col in enumerate(header) if col in COLUNAS_BUSCA_TEXTO]
+    if not indices:
+        return pd.Series(dtype=object)
+
+    blocos = _blocos_contiguos(indices)
+    faixas = _buscar_blocos(obter_servico_sheets(), blocos, linha_inicial)
+    textos = _faixas_para_frame(faixas, blocos)
+
+    juntos = textos[[str(i) for i in indices]].agg(" ".join, axis=1)
+    juntos.index = juntos.index + linha_inicial
+    return juntos
+
+
+def _indexar(estado, textos, remover):
+    """
+    Novo estado do índice: tira as linhas para as quais remover(linhas)
+    é verdadeiro (máscara sobre um array de linhas) e acrescenta os
+    postings de `textos`.
+    """
+    postings = estado["postings"] if estado else pd.DataFrame(
+        {"termo": pd.Series(dtype=object), "linha": pd.Series(dtype=int),
+         "tf": pd.Series(dtype=int)}
+    )
+    meta = dict(estado["meta"]) if estado else {}
+    tamanhos = meta.get("tamanhos", {})
+
+    partes = [postings[~remover(postings["linha"].to_numpy())]]
+    linhas = np.fromiter((int(linha) for linha in tamanhos), dtype=int)
+    tamanhos = {
+        str(linha): n for linha, n, sai in
+        zip(linhas.tolist(), tamanhos.values(), remover(linhas))
+        if not sai
+    }
+
+    for inicio in range(0, len(textos), LOTE_INDEXACAO):
+        frequencias, tamanhos_lote = _termos_textos(
+            textos.iloc[inicio:inicio + LOTE_INDEXACAO]
+        )
+        partes.append(frequencias)
+        tamanhos.update({
+            str(linha): int(n) for linha, n in tamanhos_lote.items()
+        })
+
+    meta["tamanhos"] = tamanhos
+    return _montar_estado_indice(pd.concat(partes, ignore_index=True), meta)
+
+
+def atualizar_indice_textos():
+    """
+    Atualiza o índice textual de forma incremental e o grava em disco.
+
+    Cada linha indexada guarda o "Carimbo de data/hora" com que foi lida;
+    a partir da primeira linha cujo carimbo não bate com o snapshot atual
+    (linhas novas, apagadas ou reordenadas) os textos são relidos da
+    planilha — normalmente só o final da aba. Se o índice for mais antigo
+    que INTERVALO_SYNC_COMPLETO, ou se as colunas mudarem, reindexa tudo
+    (pega edições feitas direto na planilha).
+    """
+    header, dados, versao = obter_dados_planilha()
+    if not header:
+        return _indice_textos["estado"]
+
+    estado = _indice_textos["estado"]
+    if estado is not None and estado.get("versao") == versao:
+        return estado  # nada sincronizado desde a última conferência
+
+    with _lock_indice_textos:
+        estado = _indice_textos["estado"] or _ler_indice_textos()
+        colunas = [col for col in header if col in COLUNAS_BUSCA_TEXTO]
+        carimbos = dados["0"].tolist() if len(dados) else []
+
+        if estado is None or (
+            estado["meta"].get("colunas") != colunas
+            or time.time() - estado["meta"].get("reindexado_em", 0)
+            > INTERVALO_SYNC_COMPLETO
+        ):
+            estado, primeira = None, 0
+        else:
+            anteriores = estado["meta"]["carimbos"]
+            primeira = next(
+                (i for i, (a, b) in enumerate(zip(anteriores, carimbos))
+                 if a != b),
+                min(len(anteriores), len(carimbos))
+            )
+            if primeira == len(anteriores) == len(carimbos):
+                estado["versao"] = versao
+                _indice_textos["estado"] = estado
+                return estado
+
+        # relê da primeira linha divergente (linha na planilha = posição + 2)
+        linha_inicial = primeira + 2
+        textos = _buscar_textos_planilha(header, linha_inicial)
+        textos = textos[textos.index < len(carimbos) + 2]
+
+        estado = _indexar(estado, textos, lambda posicoes: posicoes >= linha_inicial)
+        estado["meta"].update({
+            "colunas": colunas,
+            "carimbos": carimbos,
+            "reindexado_em": (
+                time.time() if primeira == 0
+                else estado["meta"]["reindexado_em"]
+            ),
+        })
+        _gravar_indice_textos(estado)
+        estado = _montar_estado_indice(estado["postings"], estado["meta"])
+        estado["versao"] = versao
+        _indice_textos["estado"] = estado
+        return estado
+
+
+def reindexar_linha_textos(linha_sheet, campos):
+    """
+    Reindexa uma linha logo após gravar seus textos (Importação SAEP), sem
+    reler a planilha. campos = {"Coluna": texto} com os textos atuais.
+    """
+    reindexar_linhas_textos([(linha_sheet, campos)])
+
+
+def reindexar_linhas_textos(edicoes):
+    """
+    Como reindexar_linha_textos, para várias linhas de uma vez (importação
+    em lote): edicoes = [(linha_sheet, {"Coluna": texto})]. O índice é
+    regravado uma única vez.
+    """
+    if not edicoes:
+        return
+
+    with _lock_indice_textos:
+        estado = _indice_textos["estado"] or _ler_indice_textos()
+        if estado is None:
+            return  # ainda sem índice: será montado completo na 1ª busca
+
+        textos = pd.Series({
+            linha_sheet: " ".join(
+                str(v) for col, v in campos.items()
+                if col in COLUNAS_BUSCA_TEXTO and v
+            )
+            for linha_sheet, campos in edicoes
+        })
+        linhas = textos.index.to_numpy()
+        estado = _indexar(estado, textos, lambda posicoes: np.isin(posicoes, linhas))
+        _gravar_indice_textos(estado)
+        _indice_textos["estado"] = estado
+
+
+def buscar_textos(consulta, limite=50):
+    """
+    Linhas da planilha cujos textos contêm os termos da consulta, ordenadas
+    por BM25. Retorna DataFrame com "Linha planilha", "Pontuação" e
+    "Termos encontrados" (quantos termos da consulta a linha tem).
+    """
+    estado = atualizar_indice_textos()
+    vazio = pd.DataFrame(
+        columns=["Linha planilha", "Pontuação", "Termos encontrados"]
+    )
+    if estado is None or not consulta or not consulta.strip():
+        return vazio
+
+    termos = _termos_consulta(consulta)
+
+    comprimento = estado["comprimento"]
+    total = len(comprimento)
+    n_docs = max(len(estado["meta"]["carimbos"]), 1)
+    media = max(comprimento.sum() / n_docs, 1.0)
+
+    pontos = np.zeros(total)
+    encontrados = np.zeros(total, dtype=int)
+    vocabulario = estado["vocabulario"]
+
+    for termo in termos:
+        k = vocabulario.searchsorted(termo)
+        if k == len(vocabulario) or vocabulario[k] != termo:
+            continue
+        faixa = slice(estado["inicios"][k], estado["inicios"][k + 1])
+        linhas, tf = estado["linhas"][faixa], estado["tf"][faixa]
+
+        idf = np.log(1 + (n_docs - len(linhas) + 0.5) / (len(linhas) + 0.5))
+        normalizacao = BM25_K1 * (
+            1 - BM25_B + BM25_B * comprimento[linhas] / media
+        )
+        pontos[linhas] += idf * tf * (BM25_K1 + 1) / (tf + normalizacao)
+        encontrados[linhas] += 1
+
+    achadas = np.flatnonzero(encontrados)
+    if not len(achadas):
+        return vazio
+
+    ordem = np.lexsort((-pontos[achadas], -encontrados[achadas]))[:limite]
+    achadas = achadas[ordem]
+    return pd.DataFrame({
+        "Linha planilha": achadas,
+        "Pontuação": pontos[achadas].round(2),
+        "Termos encontrados": encontrados[achadas],
+    })
+
+
 # ---------------------------
-# FUNÇÃO PARA ATUALIZAR A LINHA DO BO ***** A VER SE IREMOS UTILIZAR****
+# FUNÇÕES PARA ATUALIZAR LINHAS DO BO (ESCRITA EM LOTE)
 # ---------------------------
 
+# {id da aba: {"Nome da Coluna": índice 1-based}} — evita ler a linha 1 a
+# cada gravação. É limpo quando a sincronização detecta mudança no cabeçalho.
+_cabecalhos_abas = {}
+
+
+def _mapa_cabecalho(sheet):
+    mapa = _cabecalhos_abas.get(sheet.id)
+    if mapa is None:
+        mapa = {}
+        header = chamar_sheets(lambda: sheet.row_values(1), "leitura")
+        for i, nome in enumerate(header, start=1):
+            mapa.setdefault(nome, i)  # 1ª ocorrência, como header.index()
+        _cabecalhos_abas[sheet.id] = mapa
+    return mapa
+
+
+# gravações aguardando envio: {id(sheet): [(edicoes, Future)]}
+_escritas_pendentes = {}
+_lock_escritas = threading.Lock()
+
+
+def atualizar_linhas_em_lote(sheet, edicoes):
+    """
+    sheet: objeto gspread Worksheet
+    edicoes: lista de (linha_sheet, {"Nome da Coluna": valor}),
+             linha_sheet 1-based como no Google Sheets
+
+    As gravações entram numa fila: a primeira de cada janela de
+    INTERVALO_ESCRITAS espera a janela fechar e envia tudo o que chegou
+    nela (de qualquer sessão) num único batch_update, com as edições da
+    mesma linha mescladas (o último valor de cada célula vence). Bloqueia
+    até o envio; um erro no envio é repassado a todos os chamadores.
+    Colunas que não existem no cabeçalho são ignoradas. Retorna o número
+    de células desta chamada que foram gravadas.
+    """
+    futuro = Future()
+    with _lock_escritas:
+        fila = _escritas_pendentes.setdefault(id(sheet), [])
+        fila.append((edicoes, futuro))
+        primeira = len(fila) == 1
+
+    if primeira:
+        time.sleep(INTERVALO_ESCRITAS)
+        with _lock_escritas:
+            lote = _escritas_pendentes.pop(id(sheet))
+        with _lock_cota:
+            _contadores_sheets["agrupadas"] += len(lote) - 1
+
+        try:
+            gravadas = _enviar_escritas(
+                sheet, [e for pendentes, _ in lote for e in pendentes]
+            )
+        except Exception as erro:
+            for _, f in lote:
+                f.set_exception(erro)
+        else:
+            for _, f in lote:
+                f.set_result(gravadas)
+
+    gravadas = futuro.result()
+    return len({
+        (linha_sheet, coluna_nome)
+        for linha_sheet, dict_coluna_valor in edicoes
+        for coluna_nome in dict_coluna_valor
+    } & gravadas)
+
+
+def _enviar_escritas(sheet, edicoes):
+    """
+    Um único batch_update com as edições mescladas por linha. Retorna o
+    conjunto de (linha_sheet, coluna) enviados.
+    """
+    from gspread.utils import rowcol_to_a1
+
+    mapa = _mapa_cabecalho(sheet)
+
+    por_linha = {}
+    for linha_sheet, dict_coluna_valor in edicoes:
+        por_linha.setdefault(linha_sheet, {}).update(dict_coluna_valor)
+
+    dados, gravadas = [], set()
+    for linha_sheet, dict_coluna_valor in por_linha.items():
+        for coluna_nome, valor in dict_coluna_valor.items():
+            if coluna_nome in mapa:
+                dados.append({
+                    "range": rowcol_to_a1(linha_sheet, mapa[coluna_nome]),
+                    "values": [[valor]],
+                })
+                gravadas.add((linha_sheet, coluna_nome))
+
+    if dados:
+        # raw=False -> USER_ENTERED, mesmo comportamento do update_cell
+        chamar_sheets(lambda: sheet.batch_update(dados, raw=False), "escrita")
+
+    return gravadas
+
 
 def atualizar_celulas_especificas(sheet, linha_sheet, dict_coluna_valor):
     """
@@ -144,12 +1557,31 @@ def atualizar_celulas_especificas(sheet, linha_sheet, dict_coluna_valor):
     linha_sheet: número da linha no Google Sheets (1-based)
     dict_coluna_valor: {"Nome da Coluna": valor}
     """
-    header = sheet.row_values(1)
+    return atualizar_linhas_em_lote(sheet, [(linha_sheet, dict_coluna_valor)])
+
 
-    for coluna_nome, valor in dict_coluna_valor.items():
-        if coluna_nome in header:
-            col_index = header.index(coluna_nome) + 1  # 1-based
-            sheet.update_cell(linha_sheet, col_index, valor)
+# ---------------------------------------------------
+# CONTROLE DE LAUDOS — ALTERAÇÕES DO EDITOR
+# ---------------------------------------------------
+
+
+def alteracoes_editor(df_exibicao, edited_rows, coluna_chave="BO"):
+    """
+    Converte o delta do st.data_editor (edited_rows = {posição: {coluna:
+    valor}}) em {BO: {coluna: valor novo}}, só com as células cujo valor
+    realmente mudou em relação ao exibido.
+    """
+    alteracoes = {}
+    for posicao, campos in edited_rows.items():
+        original = df_exibicao.iloc[int(posicao)]
+        mudou = {
+            col: "" if valor is None else valor
+            for col, valor in campos.items()
+            if ("" if valor is None else valor) != original[col]
+        }
+        if mudou:
+            alteracoes[str(original[coluna_chave])] = mudou
+    return alteracoes
 
 
 # ---------------------------------------
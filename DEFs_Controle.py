@@ -0,0 +1,451 @@
+import pandas as pd
+import sqlite3
+import os
+import io
+import json
+import time
+import threading
+from contextlib import closing
+from DEFs import CAMINHO_EXCEL
+
+
+# ---------------------------------------------------
+# BANCO DO CONTROLE DE LAUDOS (SQLITE EM MODO WAL)
+# ---------------------------------------------------
+
+CAMINHO_BANCO_CONTROLE = "dados/controle_laudos.db"
+
+# diário (append-only, JSON por linha) das edições do Controle: cada
+# gravação entra primeiro aqui (com fsync) e depois é compactada no banco
+CAMINHO_DIARIO_CONTROLE = "dados/controle_diario.jsonl"
+
+# colunas do controle, na ordem em que o Resumo as monta; BO (BO + ano) é a
+# chave primária. Cada linha tem ainda "versao", incrementada a cada
+# alteração (concorrência otimista no editor do Controle).
+COLUNAS_CONTROLE = [
+    "BO",
+    "Carimbo de data/hora",
+    "Perito",
+    "Data da requisição",
+    "Protocolo",
+    "REP",
+    "D.P. requisitante",
+    "Autoridade requisitante",
+    "D.P. do fato",
+    "Natureza do fato",
+    "Endereço do local",
+    "Data de chegada",
+    "Status",
+    "Observação",
+]
+
+COLUNAS_EDITAVEIS_CONTROLE = ["REP", "Status", "Observação"]
+
+# espera por um lock de escrita antes de desistir (segundos)
+TIMEOUT_BANCO = 30
+
+# controle já lido, guardado pela assinatura (mtime, tamanho) dos arquivos
+# do banco: {"assinatura": ..., "df": DataFrame}
+_cache_controle = {"assinatura": None, "df": None}
+_lock_cache_controle = threading.Lock()
+
+# histórico já lido do diário, guardado pela assinatura (mtime, tamanho)
+# do arquivo: {"assinatura": ..., "df": DataFrame}
+_cache_historico = {"assinatura": None, "df": None}
+_lock_cache_historico = threading.Lock()
+
+# posição (bytes) do diário já aplicada no banco; None = ainda não lida.
+# O valor persistido fica em controle_meta, gravado na mesma transação que
+# aplica as entradas (compactação idempotente mesmo após uma queda).
+_estado_diario = {"compactado_ate": None}
+_lock_diario = threading.RLock()
+
+
+def _q(coluna):
+    """Nome de coluna entre aspas para o SQL (os nomes têm espaço/acento)."""
+    return '"' + coluna.replace('"', '""') + '"'
+
+
+def conectar_controle():
+    """
+    Abre uma conexão com o banco do controle (uma por operação; o SQLite em
+    WAL permite vários leitores junto com um escritor). Na primeira vez cria
+    a tabela e migra o Excel antigo, se existir.
+    """
+    os.makedirs(os.path.dirname(CAMINHO_BANCO_CONTROLE), exist_ok=True)
+    conn = sqlite3.connect(CAMINHO_BANCO_CONTROLE, timeout=TIMEOUT_BANCO)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    _preparar_banco(conn)
+    return conn
+
+
+def _preparar_banco(conn):
+    colunas = ", ".join(
+        f"{_q(col)} TEXT PRIMARY KEY" if col == "BO" else f"{_q(col)} TEXT"
+        for col in COLUNAS_CONTROLE
+    )
+    with conn:
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS controle ("
+            f"{colunas}, versao INTEGER NOT NULL DEFAULT 1)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS controle_meta "
+            "(chave TEXT PRIMARY KEY, valor TEXT)"
+        )
+
+    migrado = conn.execute(
+        "SELECT valor FROM controle_meta WHERE chave = 'migrado_excel'"
+    ).fetchone()
+    if migrado is None:
+        _migrar_excel(conn)
+
+
+def _migrar_excel(conn):
+    """Importa (uma única vez) o controle_laudos.xlsx antigo para o banco."""
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+
+        # outro processo pode ter migrado enquanto esperávamos o lock
+        if conn.execute(
+            "SELECT 1 FROM controle_meta WHERE chave = 'migrado_excel'"
+        ).fetchone():
+            return
+
+        if os.path.exists(CAMINHO_EXCEL):
+            df = pd.read_excel(CAMINHO_EXCEL)
+            df = df[[col for col in COLUNAS_CONTROLE if col in df.columns]]
+            df = df.dropna(subset=["BO"]).drop_duplicates("BO")
+            _inserir(conn, df, "INSERT OR IGNORE")
+
+        conn.execute(
+            "INSERT INTO controle_meta (chave, valor) "
+            "VALUES ('migrado_excel', datetime('now'))"
+        )
+
+
+def _valores_sql(df):
+    """DataFrame -> linhas para executemany (datas em ISO, vazios como NULL)."""
+    df = df.astype(object).copy()
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col].infer_objects()):
+            df[col] = pd.to_datetime(df[col]).dt.strftime("%Y-%m-%d %H:%M:%S")
+    df = df.astype(object).where(df.notna(), None)
+    return list(df.itertuples(index=False, name=None))
+
+
+def _inserir(conn, df, comando="INSERT"):
+    colunas = list(df.columns)
+    conn.executemany(
+        f"{comando} INTO controle ({', '.join(_q(c) for c in colunas)}) "
+        f"VALUES ({', '.join('?' * len(colunas))})",
+        _valores_sql(df),
+    )
+
+
+# ---------------------------------------------------
+# LEITURA / GRAVAÇÃO
+# ---------------------------------------------------
+
+
+def _assinatura_banco():
+    """
+    (mtime, tamanho) do banco e do -wal. Qualquer gravação — deste processo,
+    de outro ou feita fora do app — muda ao menos um dos dois.
+    """
+    assinatura = []
+    for caminho in (CAMINHO_BANCO_CONTROLE, CAMINHO_BANCO_CONTROLE + "-wal"):
+        try:
+            info = os.stat(caminho)
+            assinatura.append((info.st_mtime_ns, info.st_size))
+        except FileNotFoundError:
+            assinatura.append(None)
+    return tuple(assinatura)
+
+
+def carregar_controle():
+    """
+    Controle inteiro como DataFrame (COLUNAS_CONTROLE + versao), com a data
+    da requisição já em datetime e as colunas editáveis sem nulos.
+
+    O frame lido fica em memória enquanto os arquivos do banco não mudarem
+    (mesma assinatura); reruns do Controle não releem nem reconvertem nada.
+    O frame é compartilhado entre sessões: não alterar in-place.
+    """
+    # edições ainda só no diário entram no banco antes da leitura
+    if _diario_pendente():
+        compactar_diario()
+
+    # assinatura tirada ANTES da leitura: se houver gravação no meio, o
+    # cache fica com dados novos e chave antiga, e a próxima chamada relê
+    assinatura = _assinatura_banco()
+    if assinatura[0] is not None and (
+        _cache_controle["assinatura"] == assinatura
+    ):
+        return _cache_controle["df"]
+
+    with _lock_cache_controle:
+        if assinatura[0] is not None and (
+            _cache_controle["assinatura"] == assinatura
+        ):
+            return _cache_controle["df"]
+
+        df = _ler_controle()
+        _cache_controle.update(assinatura=assinatura, df=df)
+        return df
+
+
+def _ler_controle():
+    with closing(conectar_controle()) as conn:
+        df = pd.read_sql_query(
+            f"SELECT {', '.join(_q(c) for c in COLUNAS_CONTROLE)}, versao "
+            f"FROM controle",
+            conn,
+        )
+
+    df["Data da requisição"] = pd.to_datetime(
+        df["Data da requisição"], errors="coerce"
+    )
+    df = df.sort_values("Data da requisição", kind="stable", ignore_index=True)
+
+    for col in COLUNAS_EDITAVEIS_CONTROLE:
+        df[col] = df[col].fillna("")
+    return df
+
+
+def upsert_controle(df_novo):
+    """
+    Grava os registros do Resumo no controle, em uma passada vetorizada e
+    numa única transação: só BOs que ainda não existem são inseridos; os
+    já existentes (e o REP/Status/Observação já preenchidos) ficam
+    intocados.
+
+    Os BOs existentes são descartados com um isin contra as chaves do
+    banco; o INSERT OR IGNORE cobre quem inseriu o mesmo BO no intervalo.
+    Retorna (inseridos, ignorados).
+    """
+    colunas = [c for c in COLUNAS_CONTROLE if c in df_novo.columns]
+    df_novo = df_novo[colunas].drop_duplicates("BO", keep="last")
+
+    with closing(conectar_controle()) as conn, conn:
+        conn.execute("BEGIN IMMEDIATE")
+
+        existentes = pd.read_sql_query('SELECT "BO" FROM controle', conn)["BO"]
+        novos = df_novo[~df_novo["BO"].astype(str).isin(existentes)]
+
+        antes = conn.total_changes
+        _inserir(conn, novos, "INSERT OR IGNORE")
+        inseridos = conn.total_changes - antes
+
+    return inseridos, len(df_novo) - inseridos
+
+
+# ---------------------------------------------------
+# DIÁRIO DE EDIÇÕES (WRITE-AHEAD) + COMPACTAÇÃO
+# ---------------------------------------------------
+
+
+def _diario_pendente():
+    """Há bytes no diário além do que já foi aplicado no banco?"""
+    if not os.path.exists(CAMINHO_DIARIO_CONTROLE):
+        return False
+    compactado = _estado_diario["compactado_ate"]
+    return compactado is None or (
+        os.path.getsize(CAMINHO_DIARIO_CONTROLE) > compactado
+    )
+
+
+def _anexar_diario(entradas):
+    """Acrescenta as entradas ao diário numa única escrita, com fsync."""
+    os.makedirs(os.path.dirname(CAMINHO_DIARIO_CONTROLE), exist_ok=True)
+    texto = "".join(
+        json.dumps(e, ensure_ascii=False, default=str) + "\n" for e in entradas
+    )
+
+    with open(CAMINHO_DIARIO_CONTROLE, "a+b") as f:
+        # uma queda no meio da última escrita deixa uma linha sem "\n":
+        # fecha a linha para não emendar nela (a compactação a descarta)
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                texto = "\n" + texto
+        f.write(texto.encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def compactar_diario():
+    """
+    Aplica no banco as entradas do diário ainda não aplicadas. Cada entrada
+    traz a versao resultante, então reaplicar é inofensivo. Linhas
+    incompletas/corrompidas (queda durante a escrita) são ignoradas.
+    Retorna quantas entradas foram aplicadas.
+    """
+    with _lock_diario:
+        if not os.path.exists(CAMINHO_DIARIO_CONTROLE):
+            return 0
+        tamanho = os.path.getsize(CAMINHO_DIARIO_CONTROLE)
+
+        with closing(conectar_controle()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            linha = conn.execute(
+                "SELECT valor FROM controle_meta "
+                "WHERE chave = 'diario_compactado_ate'"
+            ).fetchone()
+            inicio = int(linha[0]) if linha else 0
+
+            with open(CAMINHO_DIARIO_CONTROLE, "rb") as f:
+                f.seek(inicio)
+                bloco = f.read(tamanho - inicio)
+            fim = inicio + bloco.rfind(b"\n") + 1  # só linhas completas
+
+            aplicadas = 0
+            for bruta in bloco[:fim - inicio].splitlines():
+                try:
+                    e = json.loads(bruta)
+                except ValueError:
+                    continue
+                if e.get("coluna") not in COLUNAS_EDITAVEIS_CONTROLE:
+                    continue
+                conn.execute(
+                    f"UPDATE controle SET {_q(e['coluna'])} = ?, versao = ? "
+                    f"WHERE \"BO\" = ?",
+                    [e["novo"], e["versao"], e["bo"]],
+                )
+                aplicadas += 1
+
+            if fim > inicio:
+                conn.execute(
+                    "INSERT OR REPLACE INTO controle_meta (chave, valor) "
+                    "VALUES ('diario_compactado_ate', ?)",
+                    [str(fim)],
+                )
+
+        _estado_diario["compactado_ate"] = fim
+        return aplicadas
+
+
+def _compactar_em_segundo_plano():
+    def tarefa():
+        try:
+            compactar_diario()
+        except sqlite3.Error:
+            pass  # fica pendente; a próxima leitura compacta
+
+    threading.Thread(
+        target=tarefa, name="compacta-diario-controle", daemon=True
+    ).start()
+
+
+def salvar_alteracoes_controle(alteracoes, versoes, usuario=""):
+    """
+    Grava {BO: {coluna: valor}} com concorrência otimista: um BO só é
+    gravado se a versao no banco ainda for a lida pelo usuário
+    (versoes = {BO: versao}).
+
+    A gravação é só um append (com fsync) no diário, uma entrada por célula:
+    (data/hora, usuário, BO, coluna, valor antigo, valor novo, versao). O
+    banco é atualizado depois, em segundo plano, por compactar_diario().
+
+    Retorna (alterados, conflitos) — conflitos são os BOs alterados por
+    outra pessoa desde a leitura (não gravados).
+    """
+    alterados, conflitos, entradas = [], [], []
+    if not alteracoes:
+        return alterados, conflitos
+    agora = time.strftime("%Y-%m-%d %H:%M:%S")
+
+    with _lock_diario:
+        # versões atuais = banco + o que ainda estiver só no diário
+        if _diario_pendente():
+            compactar_diario()
+
+        bos = list(alteracoes)
+        with closing(conectar_controle()) as conn:
+            atuais = pd.read_sql_query(
+                f"SELECT \"BO\", versao, "
+                f"{', '.join(_q(c) for c in COLUNAS_EDITAVEIS_CONTROLE)} "
+                f"FROM controle WHERE \"BO\" IN ({', '.join('?' * len(bos))})",
+                conn, params=bos,
+            ).set_index("BO")
+
+        for bo, campos in alteracoes.items():
+            campos = {
+                c: v for c, v in campos.items()
+                if c in COLUNAS_EDITAVEIS_CONTROLE
+            }
+            if not campos:
+                continue
+
+            if bo not in atuais.index or (
+                int(atuais.at[bo, "versao"]) != int(versoes.get(bo, -1))
+            ):
+                conflitos.append(bo)
+                continue
+
+            for coluna, novo in campos.items():
+                antigo = atuais.at[bo, coluna]
+                entradas.append({
+                    "data_hora": agora,
+                    "usuario": usuario,
+                    "bo": bo,
+                    "coluna": coluna,
+                    "antigo": "" if pd.isna(antigo) else antigo,
+                    "novo": novo,
+                    "versao": int(atuais.at[bo, "versao"]) + 1,
+                })
+            alterados.append(bo)
+
+        if entradas:
+            _anexar_diario(entradas)
+
+    if entradas:
+        _compactar_em_segundo_plano()
+    return alterados, conflitos
+
+
+def historico_controle(bo=None):
+    """
+    Histórico de edições lido do diário (mais recentes primeiro), opcionalmente
+    de um único BO. O diário só é relido quando muda; o frame é compartilhado
+    entre sessões: não alterar in-place.
+    """
+    colunas = ["data_hora", "usuario", "bo", "coluna", "antigo", "novo"]
+    try:
+        info = os.stat(CAMINHO_DIARIO_CONTROLE)
+    except FileNotFoundError:
+        return pd.DataFrame(columns=colunas)
+
+    # assinatura tirada ANTES da leitura, como em carregar_controle
+    assinatura = (info.st_mtime_ns, info.st_size)
+    with _lock_cache_historico:
+        if _cache_historico["assinatura"] != assinatura:
+            entradas = []
+            with open(
+                CAMINHO_DIARIO_CONTROLE, encoding="utf-8", errors="replace"
+            ) as f:
+                for linha in f:
+                    try:
+                        entradas.append(json.loads(linha))
+                    except ValueError:
+                        continue
+
+            df = pd.DataFrame(entradas, columns=colunas)
+            _cache_historico.update(
+                assinatura=assinatura,
+                df=df.iloc[::-1].reset_index(drop=True)
+            )
+        df = _cache_historico["df"]
+
+    if bo:
+        df = df[df["bo"] == bo].reset_index(drop=True)
+    return df
+
+
+def exportar_controle_excel():
+    """Controle em .xlsx (bytes), para download sob demanda."""
+    df = carregar_controle().drop(columns="versao")
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    return buffer.getvalue()
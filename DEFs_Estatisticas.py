@@ -0,0 +1,475 @@
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+import numpy as np
+import threading
+from collections import OrderedDict
+
+
+# ---------------------------------------------------
+# CUBO DE AGREGAÇÃO DA PÁGINA DE ESTATÍSTICAS
+# ---------------------------------------------------
+
+# dimensões do cubo: cada linha do cubo é uma combinação observada destas
+# colunas com a quantidade de laudos correspondente
+DIMENSOES_CUBO = [
+    "Perito",
+    "Dia",
+    "Natureza do fato",
+    "D.P. requisitante",
+    "D.P. do fato",
+    "Autoridade requisitante",
+    "Local preservado",
+]
+
+# {"versao": ..., "cubo": ...} — um cubo por versão dos dados
+_cubo_cache = {"versao": None, "cubo": None}
+_lock_cubo = threading.Lock()
+
+
+def montar_cubo(df):
+    """
+    Agrega o DataFrame do resumo em contagens por todas as DIMENSOES_CUBO
+    (dia = data da requisição sem hora). Linhas sem data ficam de fora, como
+    já ficavam no filtro por período. O cubo sai ordenado por Dia.
+    """
+    dimensoes = [
+        col for col in DIMENSOES_CUBO
+        if col == "Dia" or col in df.columns
+    ]
+
+    base = df[[col for col in dimensoes if col != "Dia"]].copy()
+    base["Dia"] = df["Data da requisição"].dt.normalize()
+    base = base[base["Dia"].notna()]
+
+    cubo = (
+        base
+        .groupby(dimensoes, observed=True, dropna=False)
+        .size()
+        .reset_index(name="Quantidade")
+        .sort_values("Dia", kind="stable")
+        .reset_index(drop=True)
+    )
+    return cubo
+
+
+def obter_cubo(df, versao):
+    """Cubo da versão atual dos dados, montado uma única vez por versão."""
+    if _cubo_cache["versao"] != versao:
+        with _lock_cubo:
+            if _cubo_cache["versao"] != versao:
+                _cubo_cache["cubo"] = montar_cubo(df)
+                _cubo_cache["versao"] = versao
+    return _cubo_cache["cubo"]
+
+
+def fatiar_cubo(cubo, peritos=None, inicio=None, fim=None):
+    """
+    Recorte do cubo para os peritos e o período (datas inclusivas).
+    O período é resolvido por busca binária sobre Dia (cubo ordenado).
+    """
+    i = 0 if inicio is None else cubo["Dia"].searchsorted(
+        pd.Timestamp(inicio), side="left")
+    j = len(cubo) if fim is None else cubo["Dia"].searchsorted(
+        pd.Timestamp(fim), side="right")
+
+    fatia = cubo.iloc[i:j]
+    if peritos:
+        fatia = fatia[fatia["Perito"].isin(peritos)]
+    return fatia
+
+
+def agregar(fatia, colunas, ordenar_por="Quantidade"):
+    """
+    Soma das quantidades do recorte agrupadas por `colunas` (equivalente a
+    value_counts/groupby().size() sobre os dados brutos). As colunas
+    categóricas voltam como texto, para os gráficos não listarem
+    categorias vazias.
+    """
+    resultado = (
+        fatia
+        .groupby(colunas, observed=True)["Quantidade"]
+        .sum()
+        .reset_index()
+    )
+    for col in colunas:
+        if isinstance(resultado[col].dtype, pd.CategoricalDtype):
+            resultado[col] = resultado[col].astype(object)
+
+    ascendente = ordenar_por != "Quantidade"
+    return resultado.sort_values(
+        ordenar_por, ascending=ascendente, kind="stable"
+    ).reset_index(drop=True)
+
+
+# ---------------------------------------------------
+# REDUÇÃO TOP-N ("OUTROS") PARA GRÁFICOS DE ALTA CARDINALIDADE
+# ---------------------------------------------------
+
+# categorias exibidas por gráfico antes de agrupar o restante em "Outros"
+TOP_N_GRAFICOS = 15
+TOP_N_MINIMO = 3
+
+# tamanho máximo do JSON de cada figura enviada ao navegador
+ORCAMENTO_PAYLOAD_GRAFICO = 150 * 1024  # bytes
+
+ROTULO_OUTROS = "Outros"
+
+
+def agrupar_outros(tabela, coluna, top_n):
+    """
+    Mantém as `top_n` categorias de `coluna` com mais laudos e soma as
+    demais em "Outros" (uma linha por combinação das outras colunas).
+    A ordem das linhas é preservada; "Outros" entra após as mantidas.
+    """
+    if top_n is None or tabela[coluna].nunique() <= top_n:
+        return tabela
+
+    principais = (
+        tabela.groupby(coluna, sort=False)["Quantidade"].sum().nlargest(top_n)
+    )
+    mantidas = tabela[coluna].isin(principais.index)
+    outros = tabela[~mantidas].copy()
+    outros[coluna] = ROTULO_OUTROS
+
+    demais = [col for col in tabela.columns if col != "Quantidade"]
+    return pd.concat(
+        [
+            parte.groupby(demais, sort=False)["Quantidade"].sum().reset_index()
+            for parte in (tabela[mantidas], outros)
+        ],
+        ignore_index=True
+    )
+
+
+# ---------------------------------------------------
+# CACHE DE FIGURAS (LRU COM LIMITE DE MEMÓRIA)
+# ---------------------------------------------------
+
+# limite do cache de figuras, somando o tamanho do JSON de cada uma
+LIMITE_CACHE_FIGURAS = 64 * 1024 * 1024  # bytes
+
+# {(id do gráfico, *chave dos filtros): JSON da figura}, do menos ao mais
+# recentemente usado; compartilhado por todas as sessões do processo
+_figuras = OrderedDict()
+_tamanho_figuras = {"bytes": 0}
+_lock_figuras = threading.Lock()
+
+# {id do gráfico: {"bytes": ..., "top_n": ...}} da última figura servida
+_payload_graficos = {}
+
+
+def chave_filtros(peritos, inicio, fim, versao):
+    """Chave do estado dos filtros: mesma seleção -> mesma chave."""
+    return (tuple(sorted(peritos or [])), str(inicio), str(fim), versao)
+
+
+def figura_em_cache(id_grafico, chave, construir,
+                    orcamento=ORCAMENTO_PAYLOAD_GRAFICO):
+    """
+    Devolve a figura do gráfico `id_grafico` para a `chave` dos filtros.
+    Na primeira vez chama construir(top_n) e guarda o JSON serializado;
+    depois apenas reconstrói a figura a partir dele, sem refazer agregação
+    e Plotly Express. Remove as menos usadas ao passar do limite de memória.
+
+    Se o JSON passar do `orcamento` (bytes), reconstrói com top_n menor até
+    caber ou chegar a TOP_N_MINIMO. orcamento=None desliga o controle (e
+    construir recebe top_n=None).
+    """
+    chave = (id_grafico,) + tuple(chave)
+
+    with _lock_figuras:
+        entrada = _figuras.get(chave)
+        if entrada is not None:
+            _figuras.move_to_end(chave)
+
+    if entrada is not None:
+        json_fig, top_n = entrada
+        _payload_graficos[id_grafico] = {"bytes": len(json_fig), "top_n": top_n}
+        return pio.from_json(json_fig)
+
+    top_n = None if orcamento is None else TOP_N_GRAFICOS
+    fig = construir(top_n)
+    json_fig = fig.to_json()
+
+    while (orcamento is not None and len(json_fig) > orcamento
+           and top_n > TOP_N_MINIMO):
+        top_n = max(TOP_N_MINIMO, top_n // 2)
+        fig = construir(top_n)
+        json_fig = fig.to_json()
+
+    _payload_graficos[id_grafico] = {"bytes": len(json_fig), "top_n": top_n}
+
+    with _lock_figuras:
+        if chave not in _figuras:
+            _figuras[chave] = (json_fig, top_n)
+            _tamanho_figuras["bytes"] += len(json_fig)
+
+        while (_tamanho_figuras["bytes"] > LIMITE_CACHE_FIGURAS
+               and len(_figuras) > 1):
+            _, (antiga, _) = _figuras.popitem(last=False)
+            _tamanho_figuras["bytes"] -= len(antiga)
+
+    return fig
+
+
+def payload_graficos():
+    """Tamanho (KB) e top-N da última figura servida de cada gráfico."""
+    tabela = pd.DataFrame([
+        {
+            "Gráfico": id_grafico,
+            "Payload (KB)": round(info["bytes"] / 1024, 1),
+            "Top-N": info["top_n"],
+        }
+        for id_grafico, info in _payload_graficos.items()
+    ])
+    if not tabela.empty:
+        tabela["Top-N"] = tabela["Top-N"].astype("Int64")  # None -> <NA>
+    return tabela
+
+
+# ---------------------------------------------------
+# GRÁFICOS DA PÁGINA DE ESTATÍSTICAS
+# ---------------------------------------------------
+
+def grafico_natureza(fatia, top_n=None):
+    contagem_natureza = agrupar_outros(
+        agregar(fatia, ["Natureza do fato"]), "Natureza do fato", top_n)
+    contagem_natureza.columns = ["Natureza", "Quantidade"]
+
+    fig = px.bar(
+        contagem_natureza,
+        x="Natureza",
+        y="Quantidade",
+        text="Quantidade"
+    )
+
+    fig.update_traces(textposition="outside")
+    fig.update_layout(
+        xaxis_title="Natureza",
+        yaxis_title="Quantidade"
+    )
+    return fig
+
+
+# ---------------------------------------------------
+# SÉRIE TEMPORAL ADAPTATIVA ("LAUDOS AO LONGO DO TEMPO")
+# ---------------------------------------------------
+
+# regra de frequência do pandas e janela da média móvel por granularidade
+GRANULARIDADES_SERIE = {
+    "Dia": ("D", 7),
+    "Semana": ("W-MON", 4),
+    "Mês": ("MS", 3),
+}
+
+# acima disso a série é reduzida por LTTB antes de ir para o navegador
+LIMITE_PONTOS_SERIE = 1000
+
+
+def escolher_granularidade(inicio, fim):
+    """Dia até ~3 meses, semana até 2 anos, mês acima disso."""
+    dias = (pd.Timestamp(fim) - pd.Timestamp(inicio)).days
+    if dias <= 92:
+        return "Dia"
+    if dias <= 730:
+        return "Semana"
+    return "Mês"
+
+
+def lttb(x, y, limite):
+    """
+    Largest-Triangle-Three-Buckets: escolhe `limite` índices de (x, y)
+    preservando a forma visual da série (picos e vales).
+    """
+    n = len(y)
+    if limite >= n or limite < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    bordas = np.linspace(1, n - 1, limite - 1).astype(int)
+
+    indices = np.empty(limite, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    anterior = 0
+
+    for k in range(limite - 2):
+        ini, fim = bordas[k], bordas[k + 1]
+        prox_ini, prox_fim = fim, bordas[k + 2] if k + 2 < len(bordas) else n
+
+        # média do próximo balde (terceiro vértice do triângulo)
+        mx = x[prox_ini:prox_fim].mean()
+        my = y[prox_ini:prox_fim].mean()
+
+        areas = np.abs(
+            (x[anterior] - mx) * (y[ini:fim] - y[anterior])
+            - (x[anterior] - x[ini:fim]) * (my - y[anterior])
+        )
+        anterior = ini + int(areas.argmax())
+        indices[k + 1] = anterior
+
+    return indices
+
+
+def serie_laudos(fatia, granularidade):
+    """Quantidade de laudos por dia/semana/mês (sem lacunas no período)."""
+    regra, _ = GRANULARIDADES_SERIE[granularidade]
+    por_dia = agregar(fatia, ["Dia"], ordenar_por="Dia").set_index("Dia")
+    return por_dia["Quantidade"].resample(regra).sum()
+
+
+def grafico_laudos_por_dia(fatia, top_n=None, granularidade="Dia"):
+    serie = serie_laudos(fatia, granularidade)
+    _, janela = GRANULARIDADES_SERIE[granularidade]
+    media_movel = serie.rolling(janela, min_periods=1).mean()
+
+    indices = lttb(serie.index.asi8, serie.to_numpy(), LIMITE_PONTOS_SERIE)
+    serie = serie.iloc[indices]
+    media_movel = media_movel.iloc[indices]
+
+    fig = go.Figure()
+    fig.add_trace(go.Scattergl(
+        x=serie.index,
+        y=serie.to_numpy(),
+        mode="lines+markers" if len(serie) <= 120 else "lines",
+        name="Quantidade",
+    ))
+    fig.add_trace(go.Scattergl(
+        x=media_movel.index,
+        y=media_movel.round(2).to_numpy(),
+        mode="lines",
+        line=dict(dash="dot"),
+        name=f"Média móvel ({janela})",
+    ))
+
+    fig.update_layout(
+        xaxis_title="Data",
+        yaxis_title=f"Quantidade por {granularidade.lower()}",
+        legend=dict(orientation="h", y=-0.2),
+    )
+    return fig
+
+
+def grafico_preservacao(fatia, top_n=None):
+    preservacao = agrupar_outros(
+        agregar(fatia, ["Local preservado"]), "Local preservado", top_n)
+    preservacao.columns = ["Preservação", "Quantidade"]
+
+    return px.pie(
+        preservacao,
+        names="Preservação",
+        values="Quantidade",
+        hole=0.4
+    )
+
+
+def grafico_dp_requisitante(fatia, top_n=None):
+    requisitante = agrupar_outros(
+        agregar(fatia, ["D.P. requisitante"]), "D.P. requisitante", top_n)
+    requisitante.columns = ["D.P. requisitante", "Quantidade"]
+
+    return px.pie(
+        requisitante,
+        names="D.P. requisitante",
+        values="Quantidade",
+        hole=0.4
+    )
+
+
+def grafico_dp_fato(fatia, top_n=None):
+    contagem_DP = agrupar_outros(
+        agregar(fatia, ["D.P. do fato"]), "D.P. do fato", top_n)
+    contagem_DP.columns = ["DP do Fato", "Quantidade"]
+
+    fig = px.bar(
+        contagem_DP,
+        x="Quantidade",
+        y="DP do Fato",
+        orientation="h",
+        text="Quantidade"
+    )
+
+    fig.update_layout(
+        yaxis=dict(autorange="reversed"),
+        xaxis_title="Quantidade de Laudos",
+        yaxis_title="Autoridade"
+    )
+    return fig
+
+
+def grafico_autoridade(fatia, top_n=None):
+    autoridade = agrupar_outros(
+        agregar(fatia, ["Autoridade requisitante"]),
+        "Autoridade requisitante", top_n)
+    autoridade.columns = ["Autoridade", "Quantidade"]
+
+    return px.treemap(
+        autoridade,
+        path=["Autoridade"],
+        values="Quantidade",
+    )
+
+
+def grafico_autoridade_natureza(fatia, top_n=None):
+    sunburst = agregar(fatia, ["Autoridade requisitante", "Natureza do fato"])
+    sunburst = agrupar_outros(sunburst, "Autoridade requisitante", top_n)
+    sunburst = agrupar_outros(sunburst, "Natureza do fato", top_n)
+
+    return px.sunburst(
+        sunburst,
+        path=["Autoridade requisitante", "Natureza do fato"],
+        values="Quantidade",
+    )
+
+
+def grafico_bolhas_autoridade(fatia, top_n=None):
+    bolhas = (
+        agrupar_outros(
+            agregar(fatia, ["Autoridade requisitante", "Natureza do fato"]),
+            "Autoridade requisitante", top_n)
+        .groupby("Autoridade requisitante", sort=True)
+        .agg(
+            quantidade=("Quantidade", "sum"),
+            naturezas=("Natureza do fato", "nunique")
+        )
+        .reset_index()
+    )
+
+    fig = px.scatter(
+        bolhas,
+        x="Autoridade requisitante",
+        y="quantidade",
+        size="naturezas",
+        labels={
+            "quantidade": "Quantidade de Laudos",
+            "naturezas": "Naturezas Distintas"
+        }
+    )
+
+    fig.update_layout(xaxis_tickangle=-45)
+    return fig
+
+
+def grafico_heatmap_autoridade(fatia, top_n=None):
+    heatmap = agregar(
+        fatia, ["Autoridade requisitante", "Dia"], ordenar_por="Dia"
+    )
+    heatmap = agrupar_outros(heatmap, "Autoridade requisitante", top_n)
+    heatmap["Mes"] = heatmap["Dia"].dt.strftime("%m/%Y")
+
+    heatmap = (
+        heatmap
+        .groupby(["Autoridade requisitante", "Mes"], sort=False)
+        ["Quantidade"]
+        .sum()
+        .reset_index()
+    )
+
+    return px.density_heatmap(
+        heatmap,
+        x="Mes",
+        y="Autoridade requisitante",
+        z="Quantidade",
+    )
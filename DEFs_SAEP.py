@@ -4,128 +4,408 @@ from googleapiclient.discovery import build
 from google.oauth2.service_account import Credentials
 from google.oauth2 import service_account
 import re
+from typing import Dict, Optional, TypedDict
 import pdfplumber
+from pdfplumber.page import Page
+from pdfminer.pdfpage import PDFPage
+import io
+import os
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 
 # ---------------------------
 # FUNÇÃO PARA EXTRAIR TEXTO DO PDF
 # ---------------------------
 
-def extrair_texto_plumber(uploaded_pdf):
-    texto = ""
-    with pdfplumber.open(uploaded_pdf) as pdf:
-        for pagina in pdf.pages:
-            texto += pagina.extract_text() + "\n"
-    return texto
+# seções que extrair_campos precisa, como (título que abre, título que
+# encerra); quando todas já foram encerradas, as páginas seguintes (anexos
+# do SAEP) nem são abertas
+SECOES_SAEP = (
+    ("Quesitos:", "SUPERINTENDÊNCIA"),
+    ("Histórico:", "Histórico Inicial PM"),
+)
+_FIM_DA_SECAO = {abre.lower(): fim.lower() for abre, fim in SECOES_SAEP}
+_PADRAO_SECOES = re.compile(
+    "|".join(re.escape(t) for secao in SECOES_SAEP for t in secao),
+    flags=re.IGNORECASE
+)
+
+
+def paginas_pdf(uploaded_pdf):
+    """
+    Gera o texto de cada página, uma de cada vez. As páginas são criadas
+    sob demanda (pdf.pages montaria todas de início) e fechadas logo após
+    a extração, liberando o cache de objetos do pdfplumber.
+    """
+    pdf = pdfplumber.open(uploaded_pdf)
+    try:
+        doctop = 0
+        for numero, pagina_pdf in enumerate(
+            PDFPage.create_pages(pdf.doc), start=1
+        ):
+            pagina = Page(pdf, pagina_pdf, page_number=numero,
+                          initial_doctop=doctop)
+            doctop += pagina.height
+            try:
+                # extract_text() devolve None em páginas sem texto (imagem)
+                yield pagina.extract_text() or ""
+            finally:
+                pagina.close()
+    finally:
+        # pdf.close() montaria todas as páginas (pdf.pages) só para
+        # fechá-las; cada página já foi fechada acima
+        if not pdf.stream_is_external:
+            pdf.stream.close()
+
+
+def extrair_texto_plumber(uploaded_pdf, parar_nas_secoes=True):
+    """
+    Texto do PDF até a página em que todas as SECOES_SAEP já foram
+    encerradas (ou do PDF inteiro, com parar_nas_secoes=False). O título
+    que encerra uma seção só conta depois do que a abre: um cabeçalho
+    "SUPERINTENDÊNCIA" antes de "Quesitos:" não interrompe a leitura.
+    """
+    partes = []
+    abertas, encerradas = set(), set()
+    for texto in paginas_pdf(uploaded_pdf):
+        partes.append(texto)
+        if parar_nas_secoes:
+            for m in _PADRAO_SECOES.finditer(texto):
+                titulo = m.group().lower()
+                if titulo in _FIM_DA_SECAO:
+                    abertas.add(_FIM_DA_SECAO[titulo])
+                elif titulo in abertas:
+                    encerradas.add(titulo)
+            if len(encerradas) == len(SECOES_SAEP):
+                break
+    return "\n".join(partes)
 
 
 # ---------------------------
 # FUNÇÃO PARA EXTRAIR E CATEGORIZAR CAMPOS DO TEXTO
 # ---------------------------
 
+class CamposSAEP(TypedDict):
+    orgao_circunscricao: Optional[str]
+    nome_requisitante: Optional[str]
+    delegado: Optional[str]          # o requisitante é o delegado
+    endereco_fato: Optional[str]
+    quesitos: Optional[str]
+    historico: Optional[str]
+    # 1.0 = seção achada e delimitada; 0.5 = achada sem o delimitador
+    # esperado (conteúdo até o próximo título / fim do texto); 0.0 = ausente
+    confianca: Dict[str, float]
+
+
+CAMPOS_SAEP = ("orgao_circunscricao", "nome_requisitante", "endereco_fato",
+               "quesitos", "historico")
+
+# títulos procurados no texto em minúsculas; cada padrão começa por um
+# literal, que o re localiza com busca rápida (uma alternância única com
+# todos os títulos seria testada posição a posição, bem mais lenta)
+_TITULOS_SAEP = {
+    "orgao_circunscricao": re.compile(r"órgão circunscrição:"),
+    "nome_requisitante": re.compile(r"nome\s+do\s+requisitante:"),
+    "endereco_fato": re.compile(r"endereço do fato:"),
+    "quesitos": re.compile(r"quesitos:"),
+    "historico": re.compile(r"histórico:"),
+    "fim_quesitos": re.compile(r"superintendência"),
+    "fim_historico": re.compile(r"histórico inicial pm"),
+}
+
+# título que encerra cada seção longa
+_FIM_SECAO = {"quesitos": "fim_quesitos", "historico": "fim_historico"}
+
+_PADRAO_NOME = re.compile(r"\s*([A-ZÁÉÍÓÚÂÊÔÃÕÇ ]+)", flags=re.IGNORECASE)
+_PADRAO_LINHA = re.compile(r"\s*(.+)")
+_PADRAO_QUESITO = re.compile(r"(\d+)\)\s*(.*?)(?=\s*\d+\)|$)", flags=re.DOTALL)
+_PADRAO_LINHAS_EM_BRANCO = re.compile(r"\n\s*\n+")
+
 
 def extrair_campos(uploaded_pdf):
     # 1 — extrai texto com pdfplumber
-    texto = extrair_texto_plumber(uploaded_pdf)
+    return extrair_campos_texto(extrair_texto_plumber(uploaded_pdf))
+
+
+def _minusculas(texto):
+    """lower() com o mesmo comprimento do texto (posições continuam válidas)."""
+    baixo = texto.lower()
+    if len(baixo) != len(texto):  # ex.: "İ" vira 2 caracteres
+        baixo = "".join(c.lower()[:1] for c in texto)
+    return baixo
 
-    # 2 — limpeza leve
+
+def _trecho(texto, baixo, titulos, campo):
+    """
+    (início do conteúdo, fim, confiança) da seção `campo`. Seções longas
+    vão até o título que as encerra; sem ele, até o próximo título
+    qualquer (ou o fim do texto) com confiança 0.5.
+    """
+    if titulos[campo] is None:
+        return None, None, 0.0
+    inicio = titulos[campo].end()
+
+    fim_secao = _FIM_SECAO.get(campo)
+    if fim_secao is None:
+        return inicio, len(texto), 1.0
+
+    m = _TITULOS_SAEP[fim_secao].search(baixo, inicio)
+    if m:
+        return inicio, m.start(), 1.0
+
+    proximos = (p.search(baixo, inicio) for p in _TITULOS_SAEP.values())
+    fim = min((m.start() for m in proximos if m), default=len(texto))
+    return inicio, fim, 0.5
+
+
+def extrair_campos_texto(texto) -> CamposSAEP:
+    """
+    Campos da requisição SAEP. Seções ausentes voltam como None (e
+    confiança 0.0) em vez de descartar o documento inteiro.
+    """
     texto = texto.replace('\r', '').strip()
+    baixo = _minusculas(texto)
+
+    # 1ª ocorrência de cada título de campo
+    titulos = {c: _TITULOS_SAEP[c].search(baixo) for c in CAMPOS_SAEP}
 
     campos = {}
+    confianca = {}
 
     # -----------------------------
     # Órgão Circunscrição
-    # padrão robusto: captura até próximo "|"
+    # captura até o próximo "|" (sem ele, só a 1ª linha)
     # -----------------------------
-    m = re.search(
-        r"Órgão Circunscrição:\s*(.*?)\s*\|",
-        texto,
-        flags=re.IGNORECASE | re.DOTALL
-    )
-    campos["orgao_circunscricao"] = m.group(
-        1).replace("\n", " ").strip() if m else None
+    inicio, fim, conf = _trecho(texto, baixo, titulos, "orgao_circunscricao")
+    valor = None
+    if inicio is not None:
+        barra = texto.find("|", inicio)
+        if barra < 0:
+            valor, conf = texto[inicio:].strip().split("\n", 1)[0], 0.5
+        else:
+            valor = texto[inicio:barra].replace("\n", " ")
+        valor = valor.strip()
+    campos["orgao_circunscricao"] = valor
+    confianca["orgao_circunscricao"] = conf
 
     # -----------------------------
-    # Delegado
+    # Delegado (nome do requisitante)
     # -----------------------------
-    m = re.search(
-        r"Nome\s+do\s+Requisitante:\s*([A-ZÁÉÍÓÚÂÊÔÃÕÇ ]+)",
-        texto,
-        flags=re.IGNORECASE
-    )
+    inicio, fim, conf = _trecho(texto, baixo, titulos, "nome_requisitante")
+    m = _PADRAO_NOME.match(texto, inicio) if inicio is not None else None
     campos["nome_requisitante"] = m.group(1).strip() if m else None
+    confianca["nome_requisitante"] = conf
 
     # -----------------------------
     # Endereço do Fato
     # captura tudo até quebra de linha
     # -----------------------------
-    m = re.search(
-        r"Endereço do Fato:\s*(.+)",
-        texto
-    )
+    inicio, fim, conf = _trecho(texto, baixo, titulos, "endereco_fato")
+    m = _PADRAO_LINHA.match(texto, inicio) if inicio is not None else None
     campos["endereco_fato"] = m.group(1).strip() if m else None
-
-    # Capturar bloco entre "Quesitos:" e "Histórico"
-    m = re.search(
-        r"Quesitos:\s*(.*?)\s*SUPERINTENDÊNCIA",
-        texto,
-        flags=re.DOTALL | re.IGNORECASE
-    )
-
-    if not m:
-        return None
-
-    bloco = m.group(1).strip()
+    confianca["endereco_fato"] = conf
 
     # -----------------------------
-    # QUESITOS
+    # QUESITOS (bloco entre "Quesitos:" e "SUPERINTENDÊNCIA")
     # -----------------------------
-    padrao = r"(\d+)\)\s*(.*?)(?=\s*\d+\)|$)"
-    matches = re.findall(padrao, bloco, flags=re.DOTALL)
-
-    quesitos_lista = [" ".join(texto.split()) for _, texto in matches]
-
-    # 🔥 AQUI está o segredo: transformar a lista em string única
-    quesitos_string = "\n".join(
-        f"{i+1}) {q}" for i, q in enumerate(quesitos_lista)
-    )
-    campos["quesitos"] = quesitos_string
+    inicio, fim, conf = _trecho(texto, baixo, titulos, "quesitos")
+    quesitos = None
+    if inicio is not None:
+        bloco = texto[inicio:fim].strip()
+        quesitos_lista = [
+            " ".join(q.split()) for _, q in _PADRAO_QUESITO.findall(bloco)
+        ]
+        if quesitos_lista:
+            # lista de quesitos -> string única, renumerada
+            quesitos = "\n".join(
+                f"{i+1}) {q}" for i, q in enumerate(quesitos_lista)
+            )
+        else:
+            quesitos, conf = " ".join(bloco.split()), 0.5
+    campos["quesitos"] = quesitos
+    confianca["quesitos"] = conf
 
     # -----------------------------
-    # HISTORICO
+    # HISTORICO (até "Histórico Inicial PM")
     # -----------------------------
-    m = re.search(
-        r"Histórico:\s*(.*?)\s*Histórico Inicial PM",
-        texto,
-        flags=re.DOTALL | re.IGNORECASE
-    )
-
-    if not m:
-        return None
-
-    historico = m.group(1).strip()
-
-    # Limpeza opcional: remover múltiplas quebras de linha
-    historico = re.sub(r"\n\s*\n+", "\n\n", historico).strip()
+    inicio, fim, conf = _trecho(texto, baixo, titulos, "historico")
+    historico = None
+    if inicio is not None:
+        # remover múltiplas quebras de linha
+        historico = _PADRAO_LINHAS_EM_BRANCO.sub(
+            "\n\n", texto[inicio:fim].strip()
+        )
     campos["historico"] = historico
+    confianca["historico"] = conf
 
+    # seção achada, mas vazia, conta como ausente
+    for campo in CAMPOS_SAEP:
+        if not campos[campo]:
+            campos[campo], confianca[campo] = None, 0.0
+    campos["delegado"] = campos["nome_requisitante"]
+    campos["confianca"] = confianca
     return campos
 
 
+def campos_incompletos(campos):
+    """Campos ausentes ou extraídos sem o delimitador esperado."""
+    return [c for c in CAMPOS_SAEP if campos["confianca"][c] < 1.0]
+
+
 # ---------------------------
-# FUNÇÃO PARA ATUALIZAR A LINHA DO BO
+# IMPORTAÇÃO EM LOTE (VÁRIOS PDFs / ZIP)
 # ---------------------------
 
+# colunas da planilha preenchidas a partir do PDF
+COLUNAS_SAEP = {
+    "orgao_circunscricao": "Órgão Circunscrição",
+    "delegado": "Delegado",
+    "endereco_fato": "Endereço do Fato",
+    "quesitos": "Quesitos",
+    "historico": "Historico",
+}
+
+# sequências com ao menos um dígito, candidatas a número de BO/protocolo
+_PADRAO_CANDIDATO = re.compile(r"[A-Za-z0-9][A-Za-z0-9./-]*\d[A-Za-z0-9./-]*")
+_NAO_ALFANUMERICO = re.compile(r"[^A-Z0-9]")
+_PREFIXO_BO = re.compile(r"^BO(?=\d)")
+
+# chaves muito curtas (ex.: "1", "2024") casariam com qualquer número do texto
+TAMANHO_MINIMO_CHAVE = 5
+
+
+def normalizar_chave_bo(valor):
+    """
+    "ab-1234/2024" -> "AB12342024" (compara BOs escritos de jeitos
+    diferentes). O prefixo "BO" antes do número é descartado, para que
+    "BO-123456/2024" no PDF case com "123456/2024" na planilha.
+    """
+    return _PREFIXO_BO.sub("", _NAO_ALFANUMERICO.sub("", str(valor).upper()))
+
+
+def arquivos_do_upload(uploads):
+    """
+    [(nome, bytes)] dos PDFs enviados; arquivos .zip são abertos e cada PDF
+    dentro deles entra como um arquivo.
+    """
+    arquivos = []
+    for upload in uploads:
+        conteudo = upload.getvalue()
+        if upload.name.lower().endswith(".zip"):
+            with zipfile.ZipFile(io.BytesIO(conteudo)) as pacote:
+                for info in pacote.infolist():
+                    if not info.is_dir() and info.filename.lower().endswith(".pdf"):
+                        arquivos.append((
+                            f"{upload.name}/{info.filename}",
+                            pacote.read(info)
+                        ))
+        else:
+            arquivos.append((upload.name, conteudo))
+    return arquivos
+
 
-def atualizar_celulas_especificas(sheet, linha_sheet, dict_coluna_valor):
+def processar_pdf_saep(nome, conteudo):
     """
-    sheet: objeto gspread Worksheet
-    linha_sheet: número da linha no Google Sheets (1-based)
-    dict_coluna_valor: {"Nome da Coluna": valor}
+    Processa UM PDF (roda num processo do pool; por isso fica no nível do
+    módulo e recebe bytes). Retorna os campos extraídos e os candidatos a
+    BO encontrados no texto, na ordem em que aparecem.
     """
-    header = sheet.row_values(1)
+    try:
+        texto = extrair_texto_plumber(io.BytesIO(conteudo))
+    except Exception as erro:
+        return {"arquivo": nome, "campos": None, "candidatos": [],
+                "erro": f"PDF ilegível: {erro}"}
+
+    candidatos = list(dict.fromkeys(
+        normalizar_chave_bo(c) for c in _PADRAO_CANDIDATO.findall(texto)
+    ))
+    return {
+        "arquivo": nome,
+        "campos": extrair_campos_texto(texto),
+        "candidatos": candidatos,
+        "erro": None,
+    }
+
+
+def extrair_lote(arquivos, ao_progredir=None, processos=None):
+    """
+    Extrai vários PDFs em paralelo (ProcessPoolExecutor; pdfplumber é
+    CPU-bound e não libera o GIL). ao_progredir(feitos, total) é chamado a
+    cada PDF concluído. Resultados na mesma ordem de `arquivos`.
+    """
+    if not arquivos:
+        return []
+
+    processos = processos or min(len(arquivos), os.cpu_count() or 1)
+    resultados = [None] * len(arquivos)
+
+    # "spawn": o processo do Streamlit tem várias threads, e fork com
+    # threads ativas pode travar os filhos
+    with ProcessPoolExecutor(
+        max_workers=processos,
+        mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        futuros = {
+            pool.submit(processar_pdf_saep, nome, conteudo): i
+            for i, (nome, conteudo) in enumerate(arquivos)
+        }
+        for feitos, futuro in enumerate(as_completed(futuros), start=1):
+            i = futuros[futuro]
+            try:
+                resultados[i] = futuro.result()
+            except Exception as erro:  # processo do pool caiu
+                resultados[i] = {"arquivo": arquivos[i][0], "campos": None,
+                                 "candidatos": [], "erro": str(erro)}
+            if ao_progredir:
+                ao_progredir(feitos, len(arquivos))
+
+    return resultados
+
+
+def casar_bos(resultados, df, bo_col, colunas_extra=()):
+    """
+    Associa cada resultado a um BO do df procurando, no texto do PDF, um
+    candidato igual (normalizado) a um BO ou a um valor de colunas_extra
+    (ex.: protocolo). Um dicionário chave -> BO é montado uma vez para o
+    lote inteiro. Preenche "bo" e "situacao" em cada resultado.
+    """
+    mapa = {}
+    for col in reversed([bo_col, *colunas_extra]):
+        if col not in df.columns:
+            continue
+        chaves = df[col].astype(str).map(normalizar_chave_bo)
+        mapa.update(zip(chaves, df[bo_col].astype(str)))
+    mapa = {
+        k: v for k, v in mapa.items() if len(k) >= TAMANHO_MINIMO_CHAVE
+    }
+
+    for r in resultados:
+        achados = list(dict.fromkeys(
+            mapa[c] for c in r["candidatos"] if c in mapa
+        ))
+        r["bo"] = achados[0] if achados else ""
+
+        if r["erro"]:
+            r["situacao"] = r["erro"]
+        elif not achados:
+            r["situacao"] = "BO não identificado"
+        elif len(achados) > 1:
+            r["situacao"] = f"Vários BOs no PDF: {', '.join(achados)}"
+        elif campos_incompletos(r["campos"]):
+            r["situacao"] = (
+                f"Revisar: {', '.join(campos_incompletos(r['campos']))}"
+            )
+        else:
+            r["situacao"] = "OK"
+    return resultados
+
 
-    for coluna_nome, valor in dict_coluna_valor.items():
-        if coluna_nome in header:
-            col_index = header.index(coluna_nome) + 1  # 1-based
-            sheet.update_cell(linha_sheet, col_index, valor)
+def campos_para_planilha(campos):
+    """Campos extraídos -> {"Coluna da planilha": valor}."""
+    campos = campos or {}
+    return {
+        coluna: campos.get(chave) or ""
+        for chave, coluna in COLUNAS_SAEP.items()
+    }
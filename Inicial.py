@@ -34,11 +34,11 @@ st.markdown(
     """
 1. **Resumo dos atendimentos (`Resumo`)**  
    Consulte os registros vindos da planilha, filtre por perito, datas e BO e visualize as principais informações do atendimento.
-   Ao aplicar os filtros, você pode atualizar o arquivo de controle em Excel com os registros selecionados.
+   Ao aplicar os filtros, você pode atualizar o controle de laudos com os registros selecionados.
 
 2. **Controle de Laudos (`Controle`)**  
    Gerencie o controle de laudos através de uma planilha editável. Visualize e edite campos como REP, Status e Observações,
-   filtre por período e salve as alterações diretamente no arquivo Excel de controle.
+   filtre por período e salve as alterações no controle (que pode ser exportado para Excel a qualquer momento).
 
 3. **Estatísticas Interativas (`Estatísticas`)**  
    Explore os dados através de gráficos interativos com Plotly. Visualize indicadores gerais, distribuição por natureza,
@@ -3,7 +3,7 @@ import pandas as pd
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from DEFs import *
-import os
+from DEFs_Controle import *
 
 
 # -------------------------------
@@ -30,10 +30,26 @@ Esta página apresenta um **resumo dos registros**, permitindo que o perito visu
 """
 )
 
-df = carregar_dados_resumo()
+# apenas as colunas usadas nesta página (exibição, filtros e controle)
+colunas_resumo = [
+    "Carimbo de data/hora",
+    "Perito",
+    "R.D.O.",
+    "Protocolo",
+    "Data da requisição",
+    "Data de chegada",
+    "Natureza do fato",
+    "Endereço do local",
+    "D.P. do fato",
+    "D.P. requisitante",
+    "Autoridade requisitante",
+]
 
-# nome das colunas conforme carregadas
-bo_col = df.columns[5]
+df = carregar_dados_resumo(colunas_resumo)
+exibir_status_dados()
+
+# nome da coluna do BO (a mesma usada na CHAVE_CONTROLE)
+bo_col = "R.D.O."
 colunas_exibir = [
     "Perito",
     "R.D.O.",
@@ -74,14 +90,8 @@ peritos_escolhidos = st.sidebar.multiselect(
     default=[]
 )
 
-# DataFrame base conforme Perito
-df_base = df.copy()
-
-# if perito_escolhido != "Todos":
-#     df_base = df_base[df_base["Perito"] == perito_escolhido]
-
-if peritos_escolhidos:
-    df_base = df_base[df_base["Perito"].isin(peritos_escolhidos)]
+# DataFrame base conforme Perito (sem cópia do frame compartilhado)
+df_base = filtrar_dados(df, filtros={"Perito": peritos_escolhidos})
 
 # 🚨 Aviso se não houver registros
 if df_base.empty:
@@ -99,13 +109,19 @@ data_final = st.sidebar.date_input(
     "Data final", value=data_max, min_value=data_min, max_value=data_max
 )
 
-# BO (opcional)
-lista_bos = sorted(df_base[bo_col].astype(str).unique().tolist())
+# BO (opcional): busca por número, protocolo ou endereço; só as melhores
+# sugestões (+ os BOs já escolhidos) vão como opções para o navegador
+busca_bo = st.sidebar.text_input("Buscar BO (número, protocolo ou endereço)")
+lista_bos = buscar_chaves(
+    df, busca_bo, bo_col, ("Protocolo", "Endereço do local"),
+    dentro_de=df_base
+)
+bos_marcados = st.session_state.get("bos_escolhidos", [])
 
 bos_escolhidos = st.sidebar.multiselect(
     "Número do BO (opcional)",
-    options=lista_bos,
-    default=[]
+    options=list(dict.fromkeys(bos_marcados + lista_bos)),
+    key="bos_escolhidos"
 )
 # botão vem por último
 aplicar_filtro = st.sidebar.button("🔎 Filtrar")
@@ -123,15 +139,12 @@ if "df_controle_novo" not in st.session_state:
 if aplicar_filtro:
     st.session_state["filtrou"] = True  # marca que houve filtro
 
-    df_filtrado = df_base[
-        (df_base["Data da requisição"] >= pd.to_datetime(data_inicial)) &
-        (df_base["Data da requisição"] <= pd.to_datetime(data_final))
-    ]
-
-    if bos_escolhidos:
-        df_filtrado = df_filtrado[
-            df_filtrado[bo_col].astype(str).isin(bos_escolhidos)
-        ]
+    df_filtrado = filtrar_dados(
+        df,
+        data_inicial,
+        data_final,
+        filtros={"Perito": peritos_escolhidos, bo_col: bos_escolhidos}
+    )
 
     # Exibe resultado final
     st.subheader("📊 Resultados filtrados")
@@ -156,50 +169,62 @@ if aplicar_filtro:
 st.divider()
 
 
-st.subheader("🗂️ Controle")
-
-df_controle_novo = st.session_state["df_controle_novo"]
-
-st.info(f"Registros selecionados para controle: {len(df_controle_novo)}")
+st.subheader("🔎 Busca nos textos dos BOs")
+st.caption(
+    "Procura no Histórico, nos Quesitos e no Endereço do Fato (sem diferenciar "
+    "acentos, maiúsculas ou plural). Os resultados mais relevantes vêm primeiro."
+)
 
-if st.button("📥 Atualizar controle (Excel)", disabled=True):
+consulta_textos = st.text_input(
+    "Palavras-chave", placeholder="ex.: arrombamento cofre"
+)
+if consulta_textos:
+    with st.spinner("Consultando o índice de textos..."):
+        resultados = buscar_textos(consulta_textos)
 
-    if df_controle_novo.empty:
-        st.error("Nenhum registro encontrado com os filtros aplicados.")
-        st.stop()
+    # linha na planilha -> posição original do snapshot (índice do df)
+    achados = df[colunas_exibir].reindex(
+        resultados["Linha planilha"].to_numpy() - 2
+    )
+    achados.insert(0, "Pontuação", resultados["Pontuação"].to_numpy())
+    achados = achados.dropna(subset=[bo_col])
 
-    import os
-    os.makedirs("dados", exist_ok=True)
+    if achados.empty:
+        st.info("Nenhum BO encontrado para essas palavras.")
+    else:
+        st.dataframe(achados, use_container_width=True, hide_index=True)
 
-    if os.path.exists(CAMINHO_EXCEL):
-        df_existente = pd.read_excel(CAMINHO_EXCEL)
+st.divider()
 
-        df_merge = pd.merge(
-            df_existente,
-            df_controle_novo,
-            on="BO",
-            how="outer",
-            suffixes=("_old", "")
-        )
+st.subheader("🗂️ Controle")
 
-        df_final = pd.DataFrame()
-        df_final["BO"] = df_merge["BO"]
+# o controle é indexado pela chave BO + ano: repetições na planilha
+# colapsariam registros distintos numa mesma linha do controle
+duplicadas = chaves_duplicadas(df, "CHAVE_CONTROLE")
+if duplicadas:
+    st.warning(
+        f"⚠️ {len(duplicadas)} chave(s) BO + ano repetida(s) na planilha."
+    )
+    with st.expander("Ver chaves repetidas"):
+        st.dataframe(pd.DataFrame({
+            "Chave": list(duplicadas),
+            "Linhas na planilha": [str(linhas) for linhas in duplicadas.values()],
+        }), use_container_width=True)
 
-        for col in df_controle_novo.columns:
-            if col == "BO":
-                continue
+df_controle_novo = st.session_state["df_controle_novo"]
 
-            col_old = f"{col}_old"
+st.info(f"Registros selecionados para controle: {len(df_controle_novo)}")
 
-            if col_old in df_merge.columns:
-                df_final[col] = df_merge[col_old].combine_first(df_merge[col])
-            else:
-                df_final[col] = df_merge[col]
+if st.button("📥 Atualizar controle", disabled=True):
 
-    else:
-        df_final = df_controle_novo.copy()
+    if df_controle_novo.empty:
+        st.error("Nenhum registro encontrado com os filtros aplicados.")
+        st.stop()
 
-    df_final.to_excel(CAMINHO_EXCEL, index=False)
+    # upsert no banco do controle: só BOs novos entram; os já existentes
+    # (com REP/Status/Observação editados no Controle) não são tocados
+    inseridos, ignorados = upsert_controle(df_controle_novo)
 
     st.success(
-        f"Controle atualizado com {len(df_controle_novo)} registros.")
+        f"Controle atualizado: {inseridos} registro(s) novo(s), "
+        f"{ignorados} já existente(s) mantido(s).")
@@ -1,7 +1,7 @@
 import streamlit as st
-import pandas as pd
-import os
+import sqlite3
 from DEFs import *
+from DEFs_Controle import *
 
 st.title("🗂️ Controle de Laudos")
 
@@ -17,25 +17,18 @@ st.markdown(
 
 st.divider()
 
-if not os.path.exists(CAMINHO_EXCEL):
-    st.warning("⚠️ Nenhum arquivo de controle encontrado.")
+# controle no banco SQLite (datas já convertidas, editáveis sem nulos);
+# o Excel antigo é migrado automaticamente na primeira abertura
+df = carregar_controle()
+
+if df.empty:
+    st.warning("⚠️ Nenhum registro de controle encontrado.")
     st.info(
-        "💡 **Dica:** Para criar um arquivo de controle, vá até a página **Resumo**, aplique os filtros desejados "
-        "e clique em **'Atualizar controle (Excel)'** para gerar o arquivo inicial."
+        "💡 **Dica:** Para criar o controle, vá até a página **Resumo**, aplique os filtros desejados "
+        "e clique em **'Atualizar controle'** para gravar os registros iniciais."
     )
     st.stop()
 
-df = pd.read_excel(CAMINHO_EXCEL)
-
-# Garante datetime
-df["Data da requisição"] = pd.to_datetime(
-    df["Data da requisição"], errors="coerce"
-)
-
-for col in ["REP", "Status", "Observação"]:
-    if col in df.columns:
-        df[col] = (df[col].astype(str).replace("nan", "").fillna(""))
-
 # ==========================================
 # SIDEBAR - FILTRO POR PERÍODO
 # ==========================================
@@ -54,13 +47,16 @@ data_inicio, data_fim = st.sidebar.date_input(
 
 aplicar_filtro = st.sidebar.button("🔎 Aplicar filtros")
 
+# nome opcional, registrado no histórico de alterações
+usuario = st.sidebar.text_input(
+    "👤 Seu nome (opcional)", key="usuario_controle",
+    help="Aparece no histórico de alterações do controle."
+)
+
 if aplicar_filtro:
-    df_filtrado = df[
-        (df["Data da requisição"] >= pd.to_datetime(data_inicio)) &
-        (df["Data da requisição"] <= pd.to_datetime(data_fim))
-    ]
+    df_filtrado = filtrar_dados(df, data_inicio, data_fim)
 else:
-    df_filtrado = df.copy()
+    df_filtrado = df
 
 # ==========================================
 # INDICADORES RÁPIDOS
@@ -108,6 +104,15 @@ colunas_editaveis = ["REP", "Status", "Observação"]
 
 df_exibicao = df_filtrado[colunas_fixas + colunas_editaveis]
 
+# versão de cada BO como estava na tela quando a edição começou
+# (concorrência otimista): só é renovada enquanto não há edição pendente;
+# BOs que ainda não estavam no controle entram com a versão atual
+versoes_atuais = dict(zip(df["BO"].astype(str), df["versao"].astype(int)))
+edicao_pendente = st.session_state.get("editor_controle", {}).get("edited_rows")
+if edicao_pendente and "versoes_controle" in st.session_state:
+    versoes_atuais.update(st.session_state["versoes_controle"])
+st.session_state["versoes_controle"] = versoes_atuais
+
 st.subheader("✏️ Atualização de controle")
 
 st.info(
@@ -132,7 +137,8 @@ df_editado = st.data_editor(
         ),
         "Observação": st.column_config.TextColumn("Observação")
     },
-    disabled=colunas_fixas
+    disabled=colunas_fixas,
+    key="editor_controle"
 )
 
 st.caption(
@@ -143,23 +149,77 @@ st.caption(
 st.divider()
 
 if st.button("💾 Salvar alterações", type="primary", use_container_width=True):
-    df_atualizado = df.copy()
-
-    # Atualiza apenas linhas editadas
-    for _, linha in df_editado.iterrows():
-        mask = df_atualizado["BO"] == linha["BO"]
+    # só as células alteradas no editor (delta), localizadas pelo BO
+    alteracoes = alteracoes_editor(
+        df_exibicao, st.session_state["editor_controle"]["edited_rows"]
+    )
 
-        for col in colunas_editaveis:
-            df_atualizado.loc[mask, col] = linha[col]
+    # versões de quando a edição começou, não as relidas nesta execução
+    versoes = {
+        bo: st.session_state["versoes_controle"][bo]
+        for bo in alteracoes if bo in st.session_state["versoes_controle"]
+    }
 
     try:
-        df_atualizado.to_excel(CAMINHO_EXCEL, index=False)
-        st.success("✅ Controle atualizado com sucesso!")
+        alterados, conflitos = (
+            salvar_alteracoes_controle(alteracoes, versoes, usuario)
+            if alteracoes else ([], [])
+        )
+    except sqlite3.OperationalError:
+        alterados, conflitos = None, []
+        st.error(
+            "❌ **Não foi possível atualizar o controle.**\n\n"
+            "O banco de controle está ocupado por outra gravação.\n\n"
+            "**Solução:** Aguarde alguns segundos e tente novamente."
+        )
+
+    # o que esta sessão gravou passa a ser a versão vista por ela
+    for bo in alterados or []:
+        st.session_state["versoes_controle"][bo] = versoes[bo] + 1
+
+    if not alteracoes:
+        st.info("Nenhuma alteração para salvar.")
+    elif alterados:
+        st.success(
+            f"✅ Controle atualizado com sucesso! "
+            f"{len(alterados)} registro(s) alterado(s)."
+        )
         st.balloons()
 
-    except PermissionError:
-        st.error(
-            "❌ **Não foi possível atualizar o arquivo.**\n\n"
-            "O arquivo Excel está aberto em outro programa.\n\n"
-            "**Solução:** Feche o arquivo 'controle_laudos.xlsx' e tente novamente."
+    if conflitos:
+        st.warning(
+            f"⚠️ {len(conflitos)} registro(s) foram alterados por outra pessoa "
+            f"depois que esta página foi carregada e não foram gravados: "
+            f"{', '.join(conflitos)}. Recarregue a página e refaça a edição."
+        )
+
+# ==========================================
+# HISTÓRICO DE ALTERAÇÕES (DIÁRIO)
+# ==========================================
+with st.expander("🕘 Histórico de alterações"):
+    historico = historico_controle()
+    if historico.empty:
+        st.caption("Nenhuma alteração registrada ainda.")
+    else:
+        st.dataframe(
+            historico.rename(columns={
+                "data_hora": "Data/hora", "usuario": "Usuário", "bo": "BO",
+                "coluna": "Coluna", "antigo": "Valor anterior",
+                "novo": "Valor novo",
+            }),
+            use_container_width=True, hide_index=True
         )
+
+# ==========================================
+# EXPORTAÇÃO (EXCEL SOB DEMANDA)
+# ==========================================
+if st.button("📤 Gerar Excel do controle"):
+    st.session_state["controle_excel"] = exportar_controle_excel()
+
+if "controle_excel" in st.session_state:
+    st.download_button(
+        "⬇️ Baixar controle_laudos.xlsx",
+        data=st.session_state["controle_excel"],
+        file_name="controle_laudos.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
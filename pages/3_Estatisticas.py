@@ -1,8 +1,7 @@
 import streamlit as st
-import pandas as pd
 import matplotlib.pyplot as plt
 from DEFs import *
-import plotly.express as px
+from DEFs_Estatisticas import *
 
 st.set_page_config(
     page_title="Estatísticas",
@@ -26,7 +25,17 @@ de forma mais dinâmica.
 # CARREGAMENTO DOS DADOS
 # ==================================================
 
-df = carregar_dados_resumo()
+# dados e versão lidos uma única vez: se a sincronização em segundo plano
+# trocar os dados no meio da execução, cubo e figuras continuam com a
+# versão do df exibido
+planilha = obter_dados_planilha()
+versao = planilha[2]
+df = carregar_dados_resumo(planilha=planilha)
+exibir_status_dados()
+
+# contagens pré-agregadas (uma vez por versão dos dados); todos os gráficos
+# são respondidos a partir de recortes deste cubo
+cubo = obter_cubo(df, versao)
 
 # ==================================================
 # SIDEBAR — FILTROS
@@ -45,10 +54,7 @@ peritos_escolhidos = st.sidebar.multiselect(
     default={}
 )
 
-df_base = df.copy()
-
-if peritos_escolhidos:
-    df_base = df_base[df_base["Perito"].isin(peritos_escolhidos)]
+df_base = filtrar_dados(df, filtros={"Perito": peritos_escolhidos})
 
 if df_base.empty:
     st.warning("⚠️ Não há dados para os filtros selecionados.")
@@ -67,10 +73,11 @@ data_inicio, data_fim = st.sidebar.date_input(
     max_value=data_max
 )
 
-df_filtrado = df_base[
-    (df_base["Data da requisição"] >= pd.to_datetime(data_inicio)) &
-    (df_base["Data da requisição"] <= pd.to_datetime(data_fim))
-]
+df_filtrado = filtrar_dados(
+    df, data_inicio, data_fim, filtros={"Perito": peritos_escolhidos}
+)
+
+fatia = fatiar_cubo(cubo, peritos_escolhidos, data_inicio, data_fim)
 
 if df_filtrado.empty:
     st.warning("⚠️ Não há registros no período selecionado.")
@@ -87,13 +94,15 @@ with col1:
     st.metric("Total de Laudos", len(df_filtrado))
 
 with col2:
-    preservados = df_filtrado["Local preservado"].value_counts().get("Sim", 0)
+    preservados = fatia.loc[
+        fatia["Local preservado"] == "Sim", "Quantidade"
+    ].sum()
     st.metric("Locais Preservados", preservados)
 
 with col3:
     st.metric(
         "Naturezas Distintas",
-        df_filtrado["Natureza do fato"].nunique()
+        fatia["Natureza do fato"].nunique()
     )
 
 st.divider()
@@ -102,40 +111,20 @@ st.divider()
 # PRIMEIRA LINHA DE GRÁFICOS
 # ==================================================
 
+# figuras memoizadas por (gráfico, peritos, período, versão dos dados)
+chave = chave_filtros(peritos_escolhidos, data_inicio, data_fim, versao)
+
 col1, col2, col3 = st.columns(3)
 
 # ==================================================
 # GRÁFICO 1 - LAUDOS POR NATUREZA
 # ==================================================
-
-col1, col2, col3 = st.columns(3)
-
 with col1:
-    with col1:
-        st.subheader("📊 Laudos por natureza")
-
-        contagem_natureza = (
-            df_filtrado["Natureza do fato"]
-            .value_counts()
-            .reset_index()
-        )
-
-        contagem_natureza.columns = ["Natureza", "Quantidade"]
-
-        fig = px.bar(
-            contagem_natureza,
-            x="Natureza",
-            y="Quantidade",
-            text="Quantidade"
-        )
-
-        fig.update_traces(textposition="outside")
-        fig.update_layout(
-            xaxis_title="Natureza",
-            yaxis_title="Quantidade"
-        )
+    st.subheader("📊 Laudos por natureza")
 
-        st.plotly_chart(fig, use_container_width=True)
+    fig = figura_em_cache(
+        "natureza", chave, lambda n: grafico_natureza(fatia, n))
+    st.plotly_chart(fig, use_container_width=True)
 
 # ==================================================
 # GRÁFICO 2 - LAUDOS POR DIA
@@ -143,27 +132,22 @@ with col1:
 with col2:
     st.subheader("📅 Laudos ao longo do tempo")
 
-    laudos_por_dia = (
-        df_filtrado
-        .groupby(df_filtrado["Data da requisição"].dt.date)
-        .size()
-        .reset_index(name="Quantidade")
+    # granularidade automática pelo tamanho do período; ao reduzir o
+    # período na barra lateral a série passa para semana/dia
+    opcao = st.selectbox(
+        "Agrupar por",
+        options=["Automático"] + list(GRANULARIDADES_SERIE),
+        key="granularidade_serie"
     )
-
-    laudos_por_dia.columns = ["Data", "Quantidade"]
-
-    fig = px.line(
-        laudos_por_dia,
-        x="Data",
-        y="Quantidade",
-        markers=True
-    )
-
-    fig.update_layout(
-        xaxis_title="Data",
-        yaxis_title="Quantidade"
+    granularidade = (
+        escolher_granularidade(data_inicio, data_fim)
+        if opcao == "Automático" else opcao
     )
 
+    fig = figura_em_cache(
+        "laudos_por_dia", chave + (granularidade,),
+        lambda n: grafico_laudos_por_dia(fatia, n, granularidade),
+        orcamento=None)
     st.plotly_chart(fig, use_container_width=True)
 
 # ==================================================
@@ -172,21 +156,8 @@ with col2:
 with col3:
     st.subheader("🚓 Preservação do local")
 
-    preservacao = (
-        df_filtrado["Local preservado"]
-        .value_counts()
-        .reset_index()
-    )
-
-    preservacao.columns = ["Preservação", "Quantidade"]
-
-    fig = px.pie(
-        preservacao,
-        names="Preservação",
-        values="Quantidade",
-        hole=0.4
-    )
-
+    fig = figura_em_cache(
+        "preservacao", chave, lambda n: grafico_preservacao(fatia, n))
     st.plotly_chart(fig, use_container_width=True)
 
 st.divider()
@@ -203,21 +174,8 @@ col1, col2, col3 = st.columns(3)
 with col1:
     st.subheader("🚓 DP Requisitante")
 
-    requisitante = (
-        df_filtrado["D.P. requisitante"]
-        .value_counts()
-        .reset_index()
-    )
-
-    requisitante.columns = ["D.P. requisitante", "Quantidade"]
-
-    fig = px.pie(
-        requisitante,
-        names="D.P. requisitante",
-        values="Quantidade",
-        hole=0.4
-    )
-
+    fig = figura_em_cache(
+        "dp_requisitante", chave, lambda n: grafico_dp_requisitante(fatia, n))
     st.plotly_chart(fig, use_container_width=True)
 
 st.divider()
@@ -225,34 +183,12 @@ st.divider()
 # ==================================================
 # GRÁFICO 5 - LAUDOS POR DP do FATO
 # ==================================================
-
 with col2:
-    with col2:
-        st.subheader("📊 Laudos por DP do Fato")
-
-        contagem_DP = (
-            df_filtrado["D.P. do fato"]
-            .value_counts()
-            .reset_index()
-        )
-
-        contagem_DP.columns = ["DP do Fato", "Quantidade"]
-
-        fig = px.bar(
-            contagem_DP,
-            x="Quantidade",
-            y="DP do Fato",
-            orientation="h",
-            text="Quantidade"
-        )
-
-        fig.update_layout(
-            yaxis=dict(autorange="reversed"),
-            xaxis_title="Quantidade de Laudos",
-            yaxis_title="Autoridade"
-        )
+    st.subheader("📊 Laudos por DP do Fato")
 
-        st.plotly_chart(fig, use_container_width=True)
+    fig = figura_em_cache(
+        "dp_fato", chave, lambda n: grafico_dp_fato(fatia, n))
+    st.plotly_chart(fig, use_container_width=True)
 
 # ==================================================
 # GRÁFICO 6 - AUTORIDADE REQUISITANTE - TREEMAP
@@ -260,20 +196,10 @@ with col2:
 with col3:
     st.subheader("🧑‍💼 Autoridade Requisitante")
 
-    if "Autoridade requisitante" in df_filtrado.columns:
-        autoridade = (
-            df_filtrado["Autoridade requisitante"]
-            .value_counts()
-            .reset_index()
-        )
-        autoridade.columns = ["Autoridade", "Quantidade"]
-        fig = px.treemap(
-            autoridade,
-            path=["Autoridade"],
-            values="Quantidade",
-        )
-
-    st.plotly_chart(fig, use_container_width=True)
+    if "Autoridade requisitante" in fatia.columns:
+        fig = figura_em_cache(
+            "autoridade", chave, lambda n: grafico_autoridade(fatia, n))
+        st.plotly_chart(fig, use_container_width=True)
 
 # ==================================================
 # TERCEIRA  LINHA DE GRÁFICOS
@@ -284,96 +210,37 @@ col1, col2, col3 = st.columns(3)
 # ==================================================
 # GRÁFICO 7 - AUTORIDADE REQUISITANTE - SUNBURST
 # ==================================================
-
 with col1:
     st.subheader("☀️ Autoridade x Natureza do Fato")
 
-    if "Autoridade requisitante" in df_filtrado.columns:
-        autoridade = (
-            df_filtrado["Autoridade requisitante"]
-            .value_counts()
-            .reset_index()
-        )
-        autoridade.columns = ["Autoridade", "Quantidade"]
-        fig = px.sunburst(
-            df_filtrado,
-            path=["Autoridade requisitante", "Natureza do fato"],
-        )
-
+    if "Autoridade requisitante" in fatia.columns:
+        fig = figura_em_cache(
+            "autoridade_natureza", chave,
+            lambda n: grafico_autoridade_natureza(fatia, n))
         st.plotly_chart(fig, use_container_width=True)
 
-
 # ==================================================
 # GRÁFICO 8 - AUTORIDADE REQUISITANTE - BOLHAS
 # ==================================================
-
 with col2:
     st.subheader("🫧 Volume x Diversidade de Laudos por Autoridade")
 
-    if "Autoridade requisitante" in df_filtrado.columns:
-        autoridade = (
-            df_filtrado["Autoridade requisitante"]
-            .value_counts()
-            .reset_index()
-        )
-
-        bolhas = (
-            df_filtrado
-            .groupby("Autoridade requisitante")
-            .agg(
-                quantidade=("Autoridade requisitante", "count"),
-                naturezas=("Natureza do fato", "nunique")
-            )
-            .reset_index()
-        )
-
-        fig = px.scatter(
-            bolhas,
-            x="Autoridade requisitante",
-            y="quantidade",
-            size="naturezas",
-            labels={
-                "quantidade": "Quantidade de Laudos",
-                "naturezas": "Naturezas Distintas"
-            }
-        )
-
-        fig.update_layout(xaxis_tickangle=-45)
-
+    if "Autoridade requisitante" in fatia.columns:
+        fig = figura_em_cache(
+            "bolhas_autoridade", chave,
+            lambda n: grafico_bolhas_autoridade(fatia, n))
         st.plotly_chart(fig, use_container_width=True)
 
-
 # ==================================================
 # GRÁFICO 9 - AUTORIDADE REQUISITANTE - HEATMAP
 # ==================================================
-
 with col3:
     st.subheader("🔥 Demanda por Autoridade ao Longo do Tempo")
 
-    if "Autoridade requisitante" in df_filtrado.columns:
-        autoridade = (
-            df_filtrado["Autoridade requisitante"]
-            .value_counts()
-            .reset_index()
-        )
-
-        df_heat = df_filtrado.copy()
-        df_heat["Mes"] = df_heat["Data da requisição"].dt.strftime("%m/%Y")
-
-        heatmap = (
-            df_heat
-            .groupby(["Autoridade requisitante", "Mes"])
-            .size()
-            .reset_index(name="Quantidade")
-        )
-
-        fig = px.density_heatmap(
-            heatmap,
-            x="Mes",
-            y="Autoridade requisitante",
-            z="Quantidade",
-        )
-
+    if "Autoridade requisitante" in fatia.columns:
+        fig = figura_em_cache(
+            "heatmap_autoridade", chave,
+            lambda n: grafico_heatmap_autoridade(fatia, n))
         st.plotly_chart(fig, use_container_width=True)
 
 
@@ -382,3 +249,20 @@ with col3:
 # ==================================================
 st.subheader("📄 Dados filtrados")
 st.dataframe(df_filtrado, use_container_width=True)
+
+with st.expander("🧠 Memória do conjunto de dados"):
+    memoria = relatorio_memoria(df)
+    st.caption(
+        f"Total em memória: {memoria['Memória (KB)'].sum() / 1024:.1f} MB "
+        f"({len(df)} registros)."
+    )
+    st.dataframe(memoria, use_container_width=True)
+
+with st.expander("📦 Tamanho dos gráficos enviados ao navegador"):
+    st.caption(
+        f"Gráficos com muitas categorias mostram as {TOP_N_GRAFICOS} "
+        f"principais e agrupam o restante em \"{ROTULO_OUTROS}\"; o top-N é "
+        f"reduzido se a figura passar de "
+        f"{ORCAMENTO_PAYLOAD_GRAFICO // 1024} KB."
+    )
+    st.dataframe(payload_graficos(), use_container_width=True)
@@ -43,6 +43,7 @@ df, sheet = carregar_dados_geral()
 if df.empty:
     st.error("Erro ao carregar dados do Google Sheets.")
     st.stop()
+exibir_status_dados()
 
 bo_col = df.columns[1]
 colunas_exibir = [
@@ -83,12 +84,19 @@ data_final = st.sidebar.date_input(
 )
 
 # 🔧 ALTERADO — BO agora vem ANTES do botão Filtrar
-lista_bos = df[bo_col].astype(str).unique().tolist()
-lista_bos.insert(0, "Todos")  # permite não escolher BO
+# busca por número, protocolo ou endereço: só as melhores sugestões vão
+# como opções para o navegador
+colunas_busca = ("Protocolo SAEP", "Endereço")
+busca_bo = st.sidebar.text_input("Buscar BO (número, protocolo ou endereço)")
+lista_bos = buscar_chaves(df, busca_bo, bo_col, colunas_busca)
+
+bo_marcado = st.session_state.get("bo_filtro", "Todos")
+lista_bos = list(dict.fromkeys(["Todos", bo_marcado] + lista_bos))  # "Todos" permite não escolher BO
 
 bo_filtro = st.sidebar.selectbox(
     "Número do BO (opcional)",
-    options=lista_bos
+    options=lista_bos,
+    key="bo_filtro"
 )
 
 aplicar_filtro = st.sidebar.button("🔎 Filtrar")
@@ -96,23 +104,146 @@ aplicar_filtro = st.sidebar.button("🔎 Filtrar")
 # ---------------------------
 # FILTRO
 # ---------------------------
-df_filtrado = df.copy()
+df_filtrado = df
 
 if aplicar_filtro:
     st.session_state["filtrou"] = True  # marca que houve filtro
 
-    df_filtrado = df[
-        (df["Data da Requisição"] >= pd.to_datetime(data_inicial)) &
-        (df["Data da Requisição"] <= pd.to_datetime(data_final))
-    ]
-
-    if bo_filtro != "Todos":
-        df_filtrado = df_filtrado[df_filtrado[bo_col].astype(str) == bo_filtro]
+    df_filtrado = filtrar_dados(
+        df,
+        data_inicial,
+        data_final,
+        filtros={bo_col: [] if bo_filtro == "Todos" else [bo_filtro]},
+        coluna_data="Data da Requisição"
+    )
 
     st.subheader("Dados filtrados")
     st.dataframe(df_filtrado, use_container_width=True)
 
 
+# ---------------------------
+# IMPORTAÇÃO EM LOTE — VÁRIOS PDFs (OU .ZIP)
+# ---------------------------
+st.markdown("---")
+st.header("📦 Importação em lote")
+
+st.markdown(
+    """
+Envie **vários PDFs do SAEP** (ou um arquivo **.zip** com eles). O BO de cada PDF
+é identificado automaticamente pelo número do BO ou do protocolo no texto.
+Revise a tabela, corrija o BO onde for preciso e grave tudo de uma vez.
+"""
+)
+
+uploads_lote = st.file_uploader(
+    "PDFs do SAEP ou .zip", type=["pdf", "zip"],
+    accept_multiple_files=True, key="uploads_lote"
+)
+
+if uploads_lote and st.button("⚙️ Processar PDFs"):
+    arquivos = arquivos_do_upload(uploads_lote)
+    barra = st.progress(0.0, text=f"Processando {len(arquivos)} PDF(s)...")
+
+    resultados = extrair_lote(
+        arquivos,
+        lambda feitos, total: barra.progress(
+            feitos / total, text=f"Processados {feitos} de {total} PDF(s)"
+        )
+    )
+    resultados = casar_bos(resultados, df, bo_col, ["Protocolo SAEP"])
+
+    st.session_state["lote_saep"] = pd.DataFrame([
+        {
+            "Gravar": r["situacao"] == "OK",
+            "Arquivo": r["arquivo"],
+            "BO": r["bo"],
+            "Situação": r["situacao"],
+            **campos_para_planilha(r["campos"]),
+        }
+        for r in resultados
+    ])
+
+if uploads_lote and "lote_saep" in st.session_state:
+    st.subheader("🧾 Revisão da importação em lote")
+
+    lote = st.data_editor(
+        st.session_state["lote_saep"],
+        use_container_width=True,
+        hide_index=True,
+        num_rows="fixed",
+        column_config={
+            "Gravar": st.column_config.CheckboxColumn("Gravar"),
+            "BO": st.column_config.TextColumn(
+                "BO", help="Corrija aqui se o BO não foi identificado."
+            ),
+        },
+        disabled=["Arquivo", "Situação"],
+        key="editor_lote_saep"
+    )
+
+    if st.button("💾 Gravar lote no Google Sheets", type="primary"):
+        duplicadas = chaves_duplicadas(df, bo_col)
+        edicoes, sem_bo, repetidos = [], [], []
+        for _, linha in lote[lote["Gravar"]].iterrows():
+            bo = str(linha["BO"]).strip()
+            local = localizar_chave(df, bo, bo_col)
+            if local is None:
+                sem_bo.append(linha["Arquivo"])
+                continue
+            if bo in duplicadas:
+                # BO repetido (anos diferentes): não dá para saber qual
+                # linha o PDF completa
+                repetidos.append(f"{bo} (linhas {duplicadas[bo]})")
+                continue
+
+            # campos não encontrados no PDF ficam de fora, para não apagar
+            # o que já está na planilha
+            campos = {
+                col: linha[col] for col in COLUNAS_SAEP.values()
+                if pd.notna(linha[col]) and str(linha[col]).strip()
+            }
+            if campos:
+                edicoes.append((local[1], campos))
+
+        if sem_bo:
+            st.warning(
+                f"⚠️ {len(sem_bo)} PDF(s) sem BO válido na planilha não foram "
+                f"gravados: {', '.join(sem_bo)}"
+            )
+        if repetidos:
+            st.warning(
+                f"⚠️ {len(repetidos)} BO(s) aparecem mais de uma vez na planilha "
+                f"e não foram gravados: {', '.join(repetidos)}. "
+                "Confira e importe esses PDFs individualmente."
+            )
+
+        if edicoes:
+            # todas as linhas em um único batch_update
+            atualizar_linhas_em_lote(sheet, edicoes)
+
+            # textos novos já entram na busca textual, sem reler a planilha;
+            # a linha é reindexada inteira, então textos que não vieram no
+            # PDF são completados com os que já estão na planilha
+            textos = []
+            for linha_sheet, campos in edicoes:
+                faltam = [
+                    col for col in COLUNAS_SAEP.values()
+                    if col in COLUNAS_BUSCA_TEXTO and col not in campos
+                ]
+                if faltam:
+                    campos = {
+                        **carregar_campos_longos(linha_sheet, faltam), **campos
+                    }
+                textos.append((linha_sheet, campos))
+            reindexar_linhas_textos(textos)
+
+            # linhas alteradas in-place: força releitura completa no cache
+            invalidar_dados(resincronizar=True)
+
+            del st.session_state["lote_saep"]
+            st.success(f"✅ {len(edicoes)} BO(s) gravados na planilha!")
+
+
 # ---------------------------
 # SELECIONAR BO APÓS FILTRAR
 # ---------------------------
@@ -131,7 +262,17 @@ if df_filtrado.empty:
     st.warning("Nenhum registro disponível.")
     st.stop()
 
-lista_bos_filtrados = df_filtrado[bo_col].astype(str).unique().tolist()
+busca_bo_filtrado = st.text_input(
+    "Buscar BO (número, protocolo ou endereço)", key="busca_bo_filtrado"
+)
+lista_bos_filtrados = buscar_chaves(
+    df, busca_bo_filtrado, bo_col, colunas_busca, dentro_de=df_filtrado
+)
+if st.session_state["bo_escolhido"]:
+    # mantém o BO já escolhido entre as opções enquanto se busca outro
+    lista_bos_filtrados = list(dict.fromkeys(
+        [st.session_state["bo_escolhido"]] + lista_bos_filtrados
+    ))
 
 bo_escolhido = st.selectbox(
     "Selecione o BO",
@@ -158,18 +299,31 @@ if st.session_state["bo_escolhido"]:
         st.subheader("📌 Campos extraídos automaticamente do PDF")
         st.write(dados_extraidos)
 
+        incompletos = campos_incompletos(dados_extraidos)
+        if incompletos:
+            st.warning(
+                f"⚠️ Campos não encontrados ou extraídos parcialmente: "
+                f"{', '.join(incompletos)}. Confira antes de gravar."
+            )
+
         st.caption(
             "Revise os campos acima. Eles serão gravados nas colunas correspondentes "
             "da planilha (Órgão Circunscrição, Delegado, Endereço do Fato, Quesitos e Histórico)."
         )
 
-        # Localiza a linha do BO
+        # Localiza a linha do BO (posição no frame e linha real na planilha)
         bo_escolhido = st.session_state["bo_escolhido"]
-        linha_df = df.index[df[bo_col].astype(str) == bo_escolhido].tolist()
-        linha_sheet = linha_df[0] + 2  # linha real na planilha
+        posicao, linha_sheet = localizar_chave(df, bo_escolhido, bo_col)
+
+        linhas_repetidas = chaves_duplicadas(df, bo_col).get(bo_escolhido)
+        if linhas_repetidas:
+            st.warning(
+                f"⚠️ O BO {bo_escolhido} aparece nas linhas {linhas_repetidas} "
+                f"da planilha; os dados serão gravados na linha {linha_sheet}."
+            )
 
         # Copia todos os valores da linha atual
-        valores = df.iloc[linha_df[0]].tolist()
+        valores = df.iloc[posicao].tolist()
 
         # Exemplo: supondo que sua planilha tenha colunas específicas para estes campos
         valores.append(dados_extraidos["orgao_circunscricao"])
@@ -187,7 +341,31 @@ if st.session_state["bo_escolhido"]:
                 "Quesitos": dados_extraidos["quesitos"],
                 "Historico": dados_extraidos["historico"]
             }
+            # campos não encontrados no PDF ficam de fora, para não apagar
+            # o que já está na planilha
+            dict_update = {
+                col: valor for col, valor in dict_update.items()
+                if valor is not None
+            }
             atualizar_celulas_especificas(sheet, linha_sheet, dict_update)
+
+            # textos novos já entram na busca textual, sem reler a planilha;
+            # a linha é reindexada inteira, então textos que não vieram no
+            # PDF são completados com os que já estão na planilha
+            faltam = [
+                col for col in COLUNAS_SAEP.values()
+                if col in COLUNAS_BUSCA_TEXTO and col not in dict_update
+            ]
+            textos = dict_update
+            if faltam:
+                textos = {
+                    **carregar_campos_longos(linha_sheet, faltam), **dict_update
+                }
+            reindexar_linha_textos(linha_sheet, textos)
+
+            # a linha foi alterada in-place: força releitura completa no cache
+            invalidar_dados(resincronizar=True)
+
             st.success(
                 "Dados gravados com sucesso na planilha! "
                 "Essas informações já podem ser utilizadas na etapa de geração do laudo."
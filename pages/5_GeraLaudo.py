@@ -46,6 +46,7 @@ df, sheet = carregar_dados_geral()
 if df.empty:
     st.error("Erro ao carregar dados do Google Sheets.")
     st.stop()
+exibir_status_dados()
 
 bo_col = df.columns[1]
 colunas_exibir = [
@@ -87,12 +88,19 @@ data_final = st.sidebar.date_input(
 )
 
 # 🔧 ALTERADO — BO agora vem ANTES do botão Filtrar
-lista_bos = df[bo_col].astype(str).unique().tolist()
-lista_bos.insert(0, "Todos")  # permite não escolher BO
+# busca por número, protocolo ou endereço: só as melhores sugestões vão
+# como opções para o navegador
+colunas_busca = ("Protocolo SAEP", "Endereço")
+busca_bo = st.sidebar.text_input("Buscar BO (número, protocolo ou endereço)")
+lista_bos = buscar_chaves(df, busca_bo, bo_col, colunas_busca)
+
+bo_marcado = st.session_state.get("bo_filtro", "Todos")
+lista_bos = list(dict.fromkeys(["Todos", bo_marcado] + lista_bos))  # "Todos" permite não escolher BO
 
 bo_filtro = st.sidebar.selectbox(
     "Número do BO (opcional)",
-    options=lista_bos
+    options=lista_bos,
+    key="bo_filtro"
 )
 
 aplicar_filtro = st.sidebar.button("🔎 Filtrar")
@@ -100,18 +108,18 @@ aplicar_filtro = st.sidebar.button("🔎 Filtrar")
 # ---------------------------
 # FILTRO
 # ---------------------------
-df_filtrado = df.copy()
+df_filtrado = df
 
 if aplicar_filtro:
     st.session_state["filtrou"] = True  # marca que houve filtro
 
-    df_filtrado = df[
-        (df["Data da Requisição"] >= pd.to_datetime(data_inicial)) &
-        (df["Data da Requisição"] <= pd.to_datetime(data_final))
-    ]
-
-    if bo_filtro != "Todos":
-        df_filtrado = df_filtrado[df_filtrado[bo_col].astype(str) == bo_filtro]
+    df_filtrado = filtrar_dados(
+        df,
+        data_inicial,
+        data_final,
+        filtros={bo_col: [] if bo_filtro == "Todos" else [bo_filtro]},
+        coluna_data="Data da Requisição"
+    )
 
     st.subheader("Dados filtrados")
     st.dataframe(df_filtrado, use_container_width=True)
@@ -134,7 +142,17 @@ if df_filtrado.empty:
     st.warning("Nenhum registro disponível.")
     st.stop()
 
-lista_bos_filtrados = df_filtrado[bo_col].astype(str).unique().tolist()
+busca_bo_filtrado = st.text_input(
+    "Buscar BO (número, protocolo ou endereço)", key="busca_bo_filtrado"
+)
+lista_bos_filtrados = buscar_chaves(
+    df, busca_bo_filtrado, bo_col, colunas_busca, dentro_de=df_filtrado
+)
+if st.session_state["bo_escolhido"]:
+    # mantém o BO já escolhido entre as opções enquanto se busca outro
+    lista_bos_filtrados = list(dict.fromkeys(
+        [st.session_state["bo_escolhido"]] + lista_bos_filtrados
+    ))
 
 bo_escolhido = st.selectbox(
     "Selecione o BO",
@@ -148,8 +166,22 @@ bo_escolhido = st.selectbox(
 
 # Inicializa session_state se não existir
 if bo_escolhido:
-    registro = df_filtrado[df_filtrado[bo_col].astype(
-        str) == bo_escolhido].iloc[0]
+    # posição no frame e linha real na planilha, via índice do BO
+    posicao, linha_sheet = localizar_chave(df, bo_escolhido, bo_col)
+    registro = df.iloc[posicao]
+
+    linhas_repetidas = chaves_duplicadas(df, bo_col).get(bo_escolhido)
+    if linhas_repetidas:
+        st.warning(
+            f"⚠️ O BO {bo_escolhido} aparece nas linhas {linhas_repetidas} "
+            f"da planilha; usando a linha {linha_sheet}."
+        )
+
+    # textos longos (Histórico, Quesitos) são buscados só para o BO aberto
+    registro = pd.concat([
+        registro,
+        pd.Series(carregar_campos_longos(linha_sheet), dtype=object)
+    ])
 
     st.success("BO carregado! Confira os dados abaixo antes de gerar o laudo.")
     st.dataframe(registro.to_frame())